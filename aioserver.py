@@ -0,0 +1,180 @@
+# asyncio server mode for /scorecard. Requests are accepted on the event loop and the rendering is handed to a process
+# pool, so a burst of uploads renders on every core instead of queueing behind the GIL in a couple of request threads.
+#
+# python aioserver.py --port 5000 --workers 4 --queue 16
+#
+# When more than --queue cards are rendering or waiting, new requests get a 503 with Retry-After instead of piling up.
+# POST /scorecard?async=1 doesn't wait for the card: it answers 202 with a job id and a URL to fetch the card from,
+# GET /scorecard/jobs/<id> then returns 202 until it's done and the card (or the error) after that.
+
+import argparse, asyncio, logging, os, time, uuid
+from concurrent.futures import ProcessPoolExecutor
+from aiohttp import web
+from yarl import URL
+from common import worker
+from common.encode import encoder
+from common.metrics import metrics
+from common.scorecard import InvalidCall, UnsupportedGame
+from common.storage import storage
+
+logging.basicConfig(level=logging.ERROR, format="[%(asctime)s] [%(levelname)s] %(message)s", datefmt='%H:%M:%S')
+log = logging.getLogger('aioserver')
+log.setLevel(logging.INFO)
+
+# Finished jobs are kept this long for the client to come and fetch them.
+JOB_TTL = 300
+
+
+class Job:
+    __slots__ = ['task', 'finished']
+
+    def __init__(self, task):
+        self.task = task
+        self.finished = None
+
+
+def error_response(e):
+    """Same statuses main.py uses for the same failures."""
+    if isinstance(e, SyntaxError):
+        metrics.count('failures', reason='parse')
+        return web.Response(text='Failed to parse data.', status=500)
+    if isinstance(e, InvalidCall):
+        metrics.count('failures', reason=e.reason)
+        return web.Response(text=str(e), status=400)
+    if isinstance(e, UnsupportedGame):
+        metrics.count('failures', reason=e.reason)
+        return web.Response(text=str(e), status=406)
+    log.error(e)
+    metrics.count('failures', reason='render')
+    return web.Response(text=repr(e), status=500)
+
+
+def image_response(request, module, data, stored):
+    filename = time.strftime(f"{module}-%Y%m%d-%H%M%S.{encoder.extension}")
+    headers = {'Content-Disposition': f'attachment; filename={filename}'}
+    if stored:
+        headers['X-Scorecard-Id'] = str(stored.id)
+        headers['X-Scorecard-Url'] = str(request.url.join(URL(stored.url)))
+    return web.Response(body=data, content_type=encoder.mimetype, headers=headers)
+
+
+class Renderer:
+    """
+    Bounded front of the process pool. in_flight counts the slots taken: cards rendering, cards waiting for a free
+    worker, and requests still being read that are going to be one of those.
+    """
+    def __init__(self, workers, queue, games_path='games.json'):
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=worker.init, initargs=(games_path,))
+        self.queue = queue
+        self.in_flight = 0
+        self.jobs = {}
+
+    def reserve(self):
+        """
+        Take a slot, False if they're all taken. Call it before the first await so a burst can't all get in before any
+        of them is counted, and hand the slot to render() or give it back with release().
+        """
+        if self.in_flight >= self.queue:
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+
+    def render(self, data):
+        """Start rendering in a reserved slot. Returns a future, the slot is released when it's done or cancelled."""
+        future = asyncio.get_running_loop().run_in_executor(self.pool, worker.render, data)
+        future.add_done_callback(lambda future: self.release())
+        return future
+
+    def submit(self, data):
+        """render() in the background, returns the job id to look it up by in jobs."""
+        job_id = uuid.uuid4().hex
+        job = self.jobs[job_id] = Job(self.render(data))
+        job.task.add_done_callback(lambda task: setattr(job, 'finished', time.monotonic()))
+        return job_id
+
+    def expire(self):
+        now = time.monotonic()
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished and now - job.finished > JOB_TTL]:
+            del self.jobs[job_id]
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def scorecard(request):
+    renderer = request.app['renderer']
+    metrics.count('requests', endpoint='scorecard')
+    if not renderer.reserve():
+        metrics.count('failures', reason='busy')
+        return web.Response(text='busy, try again shortly', status=503, headers={'Retry-After': '1'})
+    try:
+        data = await request.read()
+    except BaseException:
+        renderer.release()
+        raise
+
+    if request.query.get('async') == '1':
+        renderer.expire()
+        job_id = renderer.submit(data)
+        url = str(request.app.router['job'].url_for(job_id=job_id))
+        return web.json_response({'job': job_id, 'url': url}, status=202, headers={'Location': url})
+
+    start = time.perf_counter()
+    try:
+        module, img, elapsed, stored = await renderer.render(data)
+    except Exception as e:
+        return error_response(e)
+    finally:
+        # Time spent waiting for a free worker plus the render itself, which the workers record as 'worker'.
+        metrics.observe('stage_seconds', time.perf_counter() - start, stage='pool')
+    log.info(f'Generating {module} scorecard')
+    return image_response(request, module, img, stored)
+
+
+async def job(request):
+    job = request.app['renderer'].jobs.get(request.match_info['job_id'])
+    if job is None:
+        return web.Response(text='no such job', status=404)
+    if not job.task.done():
+        return web.Response(text='still rendering', status=202, headers={'Retry-After': '1'})
+    try:
+        module, img, elapsed, stored = job.task.result()
+    except Exception as e:
+        return error_response(e)
+    return image_response(request, module, img, stored)
+
+
+async def card(request):
+    path = storage.path(int(request.match_info['card_id']), request.match_info['extension'])
+    if path is None:
+        return web.Response(text='no such card', status=404)
+    return web.FileResponse(path, headers={'Cache-Control': 'public, max-age=31536000, immutable'})
+
+
+async def metrics_endpoint(request):
+    return web.Response(text=metrics.render(), content_type='text/plain')
+
+
+def make_app(workers=os.cpu_count(), queue=None, games_path='games.json'):
+    app = web.Application(client_max_size=1024 * 1024)
+    app['renderer'] = Renderer(workers, queue or workers * 4, games_path)
+    app.router.add_post('/scorecard', scorecard)
+    app.router.add_get('/scorecard/jobs/{job_id}', job, name='job')
+    app.router.add_get('/metrics', metrics_endpoint)
+    app.router.add_get(r'/cards/{card_id:\d+}.{extension}', card)
+    app.on_cleanup.append(lambda app: asyncio.get_running_loop().run_in_executor(None, app['renderer'].close))
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve /scorecard from an asyncio server backed by a process pool.')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='render processes (default: all cpus)')
+    parser.add_argument('--queue', type=int, help='max cards rendering or waiting before 503s (default: 4 per worker)')
+    args = parser.parse_args()
+    metrics.clear()
+    web.run_app(make_app(args.workers, args.queue), host=args.host, port=args.port)
@@ -0,0 +1,132 @@
+# Render scorecards for an archive of stored save_m payloads across a process pool.
+#
+# python batch.py archive.jsonl -o out/ -j 4
+# python batch.py saves/*.xml -o out/
+#
+# .jsonl inputs are read a line at a time, each line being {"id": ..., "call": "<call ...>...</call>"}
+# (id is optional and defaults to the line number, it has to be usable as a file name and unique across the inputs).
+# Anything else is treated as a single save_m xml file named by its stem. Cards are written to <out>/<id>.<ext> in
+# input order. Failures, skipped inputs included, are logged and counted but don't stop the run, and make it exit 1.
+
+import argparse, json, logging, os, sys, time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# Every input is a different card and they all end up on disk anyway, so workers skip the render cache and storage.
+os.environ.setdefault('SCORECARD_CACHE_MB', '0')
+os.environ.setdefault('SCORECARD_SAVE', '0')
+
+from common import worker
+from common.encode import encoder
+
+logging.basicConfig(level=logging.ERROR, format="[%(asctime)s] [%(levelname)s] %(message)s", datefmt='%H:%M:%S')
+log = logging.getLogger('batch')
+log.setLevel(logging.INFO)
+
+def render(item):
+    """Worker side. Returns (id, image bytes or None, error or None, seconds spent)."""
+    card_id, data = item
+    start = time.perf_counter()
+    try:
+        module, img, elapsed, stored = worker.render(data)
+        return card_id, img, None, elapsed
+    except Exception as e:
+        return card_id, None, repr(e), time.perf_counter() - start
+
+
+def valid_id(card_id):
+    """Whether card_id can be used as is for a file name in the output directory, so no id writes outside of it."""
+    return card_id not in ('', '.', '..') and not any(c in card_id for c in '/\\\0')
+
+
+def read_inputs(paths, skipped):
+    """
+    Yield (id, save_m bytes) lazily, so archives bigger than memory stream through.
+    Unreadable lines, ids that aren't a plain file name and ids seen before aren't yielded but logged and appended to
+    skipped, so they count as failures instead of going missing or overwriting another card.
+    """
+    seen = set()
+
+    def check(where, card_id):
+        if not valid_id(card_id):
+            log.error(f'{where}: skipping id {card_id!r}, it must be a plain file name')
+        elif card_id in seen:
+            log.error(f'{where}: skipping id {card_id!r}, it was used before')
+        else:
+            seen.add(card_id)
+            return True
+        skipped.append(where)
+        return False
+
+    for path in paths:
+        path = Path(path)
+        if path.suffix == '.jsonl':
+            with open(path, encoding='utf-8') as f:
+                for line_no, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                        card_id, data = str(entry.get('id', line_no)), entry['call'].encode('utf-8')
+                    except (ValueError, KeyError, AttributeError) as e:
+                        log.error(f'{path}:{line_no}: skipping unreadable line, {e!r}')
+                        skipped.append(f'{path}:{line_no}')
+                        continue
+                    if check(f'{path}:{line_no}', card_id):
+                        yield card_id, data
+        elif check(str(path), path.stem):
+            yield path.stem, path.read_bytes()
+
+
+def run(items, jobs, window):
+    """
+    Fan items out over the pool and yield results in input order.
+    At most window items are in flight, so a slow card holds up the output but never the memory use.
+    """
+    with ProcessPoolExecutor(max_workers=jobs, initializer=worker.init, initargs=('games.json',)) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(render, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render scorecards for stored save_m payloads.')
+    parser.add_argument('inputs', nargs='+', help='.jsonl archives and/or save_m .xml files')
+    parser.add_argument('-o', '--out', default='batch_out', help='output directory (default: batch_out)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='worker processes (default: all cpus)')
+    parser.add_argument('--report', type=int, default=100, help='log throughput every N cards (default: 100)')
+    args = parser.parse_args(argv)
+
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+    done = failed = 0
+    busy = 0.0
+    skipped = []
+    for card_id, data, error, elapsed in run(read_inputs(args.inputs, skipped), args.jobs, args.jobs * 4):
+        busy += elapsed
+        if error:
+            failed += 1
+            log.error(f'{card_id}: {error}')
+        else:
+            done += 1
+            (out / f'{card_id}.{encoder.extension}').write_bytes(data)
+        if (done + failed) % args.report == 0:
+            log.info(f'{done + failed} cards, {(done + failed) / (time.perf_counter() - start):.1f}/s')
+
+    wall = time.perf_counter() - start
+    rendered = done + failed
+    failed += len(skipped)
+    log.info(f'Rendered {done}/{rendered + len(skipped)} cards ({failed} failed, {len(skipped)} of them skipped) in '
+             f'{wall:.1f}s with {args.jobs} workers: {rendered / wall if wall else 0:.1f} cards/s, '
+             f'{busy / rendered * 1000 if rendered else 0:.1f}ms per card')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
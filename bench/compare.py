@@ -0,0 +1,69 @@
+# Compare two results files from bench.render or bench.load, e.g. the same benchmark run on two commits.
+# python -m bench.compare bench/results/8e694ee-render.json bench/results/daf4311-render.json [--threshold 10]
+#
+# Prints every number both runs have with the change between them. Throughput (*_cps, *_rps) is better higher,
+# everything else (times, memory) better lower. Exits 1 if anything got worse by more than --threshold percent.
+
+import argparse, json, sys
+
+# Per-worker details, request counts and status codes aren't something to compare.
+SKIP = ('workers', 'count', 'statuses')
+
+
+def flatten(results, prefix=''):
+    for key, value in results.items():
+        if key in SKIP:
+            continue
+        if isinstance(value, dict):
+            yield from flatten(value, f'{prefix}{key}.')
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield f'{prefix}{key}', value
+
+
+def higher_is_better(name):
+    return name.endswith(('_cps', '_rps'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare two benchmark results files.')
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=10, help='percent change counted as a regression (default: 10)')
+    args = parser.parse_args(argv)
+
+    runs = []
+    for path in (args.before, args.after):
+        with open(path) as f:
+            runs.append(json.load(f))
+    before, after = runs
+    if before['benchmark'] != after['benchmark']:
+        raise SystemExit(f"can't compare a {before['benchmark']} run with a {after['benchmark']} run")
+    for label, run in (('before', before), ('after', after)):
+        env = run['environment']
+        print(f"{label}: {env['commit']}{' (dirty)' if env['dirty'] else ''} {env['time']}, "
+              f"python {env['python']}, pillow {env['pillow']}")
+    if before['params'] != after['params']:
+        print(f"warning: different params\n  before {before['params']}\n  after  {after['params']}")
+
+    old = dict(flatten(before['results']))
+    regressions = []
+    for name, new in flatten(after['results']):
+        if name not in old:
+            continue
+        change = (new - old[name]) / old[name] * 100 if old[name] else 0.0
+        worse = -change if higher_is_better(name) else change
+        flag = ''
+        if worse > args.threshold:
+            flag = '  <-- worse'
+            regressions.append(name)
+        elif worse < -args.threshold:
+            flag = '  better'
+        print(f'{name:>40}: {old[name]:10.3f} -> {new:10.3f} ({change:+6.1f}%){flag}')
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold:g}%: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,45 @@
+# Times the card background (bg + track number) pasted sprite by sprite, the way create_image did it before
+# base_layer, against copying the pre-merged base_layer. Also prints full card time.
+# python -m bench.layers [rounds]
+
+import sys, time
+from bench.payloads import save_m
+from museca1_5 import scorecard as sc
+
+
+def variants():
+    for grade in range(9):
+        for seq in range(4):
+            for curve in range(3):
+                yield save_m(score_grade=grade, seq=seq, curve=curve, music_type=grade % 3, track_no=seq % 3)
+
+
+def sprites(info):
+    base = sc.assets.sprite('misc/bg.png', mode='RGB').copy()
+    track = sc.assets.sprite('misc/track_{}.png'.format(info.track_no))
+    base.paste(track, (0, 221), mask=track)
+    return base
+
+
+def layers(info):
+    return sc.base_layer(info.track_no).copy()
+
+
+def timed(fn, infos, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for info in infos:
+            fn(info)
+    return (time.perf_counter() - start) / (rounds * len(infos)) * 1000
+
+
+if __name__ == '__main__':
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    sc.warm()
+    cards = [sc.ScoreCard(data) for data in variants()]
+    infos = [card.extract_info(card.call) for card in cards]
+    print(f'{len(infos)} variants x {rounds} rounds')
+    before, after = timed(sprites, infos, rounds), timed(layers, infos, rounds)
+    print(f'background, sprite by sprite: {before:.3f} ms/card')
+    print(f'background, base_layer:       {after:.3f} ms/card ({before / after:.2f}x)')
+    print(f'full create_image:            {timed(cards[0].create_image, infos, 1):.3f} ms/card')
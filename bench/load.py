@@ -0,0 +1,125 @@
+# Load test for the /scorecard endpoint: POSTs payloads from bench.payloads.realistic at a fixed concurrency and reports
+# throughput, latency percentiles and status codes.
+# python -m bench.load [-c 8] [-n 1000] [--url http://host:port] [-o out.json]
+#
+# Without --url it starts main.py's app on the werkzeug dev server (threaded, one process) in a subprocess and also
+# reports that server's RSS. That's fine for comparing commits against each other; for numbers that mean something
+# in production, point --url at uWSGI (scorecard.ini) or aioserver.py running on the same machine.
+
+import argparse, http.client, os, socket, subprocess, sys, time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from bench.results import percentiles, rss_mb, save
+
+SERVER = '''
+import logging, main
+main.log.setLevel(logging.ERROR)
+main.warm()
+main.app.run(host="127.0.0.1", port={port}, threaded=True)
+'''
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(cache):
+    port = free_port()
+    env = dict(os.environ)
+    if not cache:
+        env.update(SCORECARD_CACHE_MB='0', SCORECARD_SAVE='0')
+    server = subprocess.Popen([sys.executable, '-c', SERVER.format(port=port)], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f'server exited with {server.returncode} before it was ready')
+        try:
+            status, body = post(url, '/metrics', None)
+            if status == 200:
+                return server, url
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise SystemExit("server wasn't ready after 120s")
+
+
+def post(url, path, data):
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+    try:
+        connection.request('POST' if data is not None else 'GET', parts.path.rstrip('/') + path, body=data)
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Drive /scorecard at a fixed concurrency and report throughput.')
+    parser.add_argument('-c', '--concurrency', type=int, default=8, help='requests in flight at once (default: 8)')
+    parser.add_argument('-n', '--requests', type=int, default=1000, help='requests to send in total (default: 1000)')
+    parser.add_argument('--warmup', type=int, default=20, help="requests sent first and not counted (default: 20)")
+    parser.add_argument('--seed', type=int, default=0, help='payload generator seed (default: 0)')
+    parser.add_argument('--url', help='server to test instead of starting main.py locally, e.g. http://127.0.0.1:5000')
+    parser.add_argument('--cache', action='store_true', help='leave the render cache and saving on in the local server')
+    parser.add_argument('-o', '--out', help='results file (default: bench/results/<commit>-load.json)')
+    args = parser.parse_args(argv)
+
+    from bench.payloads import realistic
+    payloads = list(realistic(args.requests + args.warmup, args.seed))
+    server = None
+    if args.url:
+        url = args.url
+    else:
+        server, url = start_server(args.cache)
+    try:
+        def send(data):
+            start = time.perf_counter()
+            try:
+                status, body = post(url, '/scorecard', data)
+            except OSError as e:
+                status = type(e).__name__
+            return status, time.perf_counter() - start
+
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            list(pool.map(send, payloads[:args.warmup]))
+            start = time.perf_counter()
+            responses = list(pool.map(send, payloads[args.warmup:]))
+            wall = time.perf_counter() - start
+        server_rss = rss_mb(server.pid) if server else None
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    statuses = {}
+    for status, seconds in responses:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    ok = [seconds for status, seconds in responses if status == 200]
+    results = {
+        'latency': percentiles([seconds for status, seconds in responses]),
+        'ok_latency': percentiles(ok),
+        'throughput_rps': len(responses) / wall,
+        'ok_throughput_rps': len(ok) / wall,
+        'wall_seconds': wall,
+        'statuses': statuses,
+        'server_rss_mb': server_rss,
+    }
+
+    latency = results['latency']
+    print(f"{len(responses)} requests at concurrency {args.concurrency} in {wall:.1f}s: "
+          f"{results['throughput_rps']:.1f} req/s, p50 {latency['p50_ms']:.1f}ms, p90 {latency['p90_ms']:.1f}ms, "
+          f"p99 {latency['p99_ms']:.1f}ms, max {latency['max_ms']:.1f}ms")
+    print(f"  statuses: {', '.join(f'{status} x{count}' for status, count in sorted(statuses.items()))}")
+    if server_rss:
+        print(f'  server rss at the end: {server_rss:.0f}MB')
+    save('load', dict(vars(args), url=url if args.url else None), results, args.out)
+    return 0 if len(ok) == len(responses) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
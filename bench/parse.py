@@ -0,0 +1,52 @@
+# Parse time per request: the old path (router parse, ScoreCard parses again, ~15 find() calls and a re.split of etc)
+# against one parse shared by the router and SaveM's single pass. Music db lookups are left out of both.
+# python -m bench.parse [rounds]
+
+import re, sys, time
+from io import BytesIO
+from lxml import etree
+from bench.payloads import save_m
+from museca1_5.savedata import SaveM
+
+
+def legacy(data):
+    call = etree.parse(BytesIO(data)).getroot()
+    model = call.get('model').split(':')
+    call = etree.parse(BytesIO(data)).getroot()
+    game_3 = call.find('game_3')
+    info = {}
+    for name in ['music_id', 'music_type', 'score', 'clear_type', 'score_grade', 'max_chain', 'critical', 'near',
+                 'error', 'etc']:
+        info[name] = game_3.find(name).text
+    info['player_name'] = game_3.find('eaappli').find('player_name').text
+    info['track_no'] = game_3.find('eaappli').find('track_no').text
+    etc = re.split(r':|,|-|>|[G]|\(|\)', info.get('etc'))
+    info['grafica'] = etc[1:4]
+    info['medel'] = [etc[7], etc[10], etc[13]]
+    info['curator_rank'], info['curve'], info['object_placement'] = etc[19], etc[23], etc[25]
+    try:
+        info['old_score'] = game_3.find('old_score').text
+    except AttributeError:
+        pass
+    return info
+
+
+def single_pass(data):
+    call = etree.parse(BytesIO(data)).getroot()
+    model = call.get('model').split(':')
+    return SaveM.from_call(call)
+
+
+if __name__ == '__main__':
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    payloads = [save_m(music_id=i, old_score=None if i % 2 else 900000) for i in range(1, 51)]
+    print(f'{len(payloads)} payloads x {rounds // len(payloads)} rounds')
+    baseline = None
+    for label, parse in [('legacy', legacy), ('single pass', single_pass)]:
+        start = time.perf_counter()
+        for _ in range(rounds // len(payloads)):
+            for data in payloads:
+                parse(data)
+        per_request = (time.perf_counter() - start) / (rounds // len(payloads) * len(payloads)) * 1e6
+        baseline = baseline or per_request
+        print(f'{label:>12}: {per_request:7.1f} us/request ({baseline / per_request:.1f}x)')
@@ -0,0 +1,80 @@
+import random, re
+from museca1_5.scorecard import mdb, package_dir
+
+SAMPLE = (package_dir / 'assets/req-game_3-save_m.xml').read_text()
+
+# Sections of the etc string save_m() can patch. card is the three grafica ids, medel the three new medels.
+ETC_FIELDS = ('card', 'medel', 'cur', 'curve', 'seq', 'mission')
+
+
+def save_m(sample=SAMPLE, **fields):
+    """
+    Copy of the sample save_m with the given game_3 fields swapped out, e.g. save_m(music_id=14, score_grade=3).
+    card, medel, cur, curve, seq and mission are patched inside etc, e.g. save_m(card=(12, 0, 40), medel=(3, 1, 1)).
+    old_score=None drops the old_score element, mission=None drops the mission from etc.
+    """
+    xml = sample
+    for name, value in fields.items():
+        if name in ETC_FIELDS:
+            if name == 'card':
+                value = ','.join(str(grafica) for grafica in value)
+            elif name == 'medel':
+                value = ','.join(f'0-&gt;{medel}' for medel in value)
+            section = rf'(?<=[>,]){name}:.*?(?=,\w+:|<)'
+            if value is None:
+                xml = re.sub(',' + section[len('(?<=[>,])'):], '', xml)
+            else:
+                xml = re.sub(section, lambda match: f'{name}:{value}', xml)
+        elif value is None:
+            xml = re.sub(rf'\s*<{name} [^>]*>[^<]*</{name}>', '', xml)
+        else:
+            xml = re.sub(rf'(<{name} [^>]*>)[^<]*', lambda match: f'{match[1]}{value}', xml)
+    return xml.encode()
+
+
+def _asset_ids(folder, pattern):
+    return sorted(int(re.fullmatch(pattern, path.name)[1]) for path in (package_dir / 'assets' / folder).glob('*.png'))
+
+
+def realistic(count, seed=0):
+    """
+    count save_m payloads spread over everything the card can show: every song in the music db in turn (so every
+    jacket, and the fallback for songs without one), all three charts, every grade, clear type, curator rank, option
+    and grafica/medel combination, with and without old_score and a mission. Every tenth card is one of the songs with
+    the longest titles, which take the text resize path. The same seed gives the same payloads.
+    """
+    songs = sorted(mdb)
+    if not songs:
+        raise SystemExit(f'{mdb.path} has no songs, drop a music-info-b.xml in there to generate payloads')
+    longest = sorted(songs, key=lambda item: len(item[1].title), reverse=True)[:max(1, len(songs) // 20)]
+    grafica = _asset_ids('grafica', r'(\d+)\.png')
+    medels = _asset_ids('medel', r'medel_(\d+)\.png')
+    ranks = _asset_ids('rank', r'rank_(\d+)\.png')
+
+    rng = random.Random(seed)
+    for i in range(count):
+        music_id, song = rng.choice(longest) if i % 10 == 9 else songs[i % len(songs)]
+        notes = rng.randint(300, 2000)
+        near, error = rng.randint(0, notes // 10), rng.randint(0, notes // 20)
+        clear_type = 4 if error == 0 else rng.choice((1, 2, 3))
+        score = rng.randint(600000, 1000000)
+        yield save_m(
+            music_id=music_id,
+            music_type=rng.randrange(3),
+            score=score,
+            old_score=None if rng.random() < 0.3 else max(0, score + rng.randint(-80000, 40000)),
+            clear_type=clear_type,
+            score_grade=rng.randrange(9),
+            max_chain=notes - error,
+            critical=notes - near - error,
+            near=near,
+            error=error,
+            player_name=rng.choice(('CAMPREV', 'A', 'MUSECA', 'WWWWWWWW', 'NANASHI')),
+            track_no=rng.randrange(3),
+            card=tuple(rng.choice(grafica) if rng.random() < 0.85 else 0 for _ in range(3)),
+            medel=tuple(rng.choice(medels) for _ in range(3)),
+            cur=rng.choice(ranks),
+            curve=rng.randrange(3),
+            seq=rng.randrange(4),
+            mission=rng.choice((None, 'G20-3(100.00%)', 'G5-1(42.50%)')),
+        )
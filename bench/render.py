@@ -0,0 +1,112 @@
+# Render latency and memory per worker for ScoreCard.generate, on payloads from bench.payloads.realistic.
+# python -m bench.render [-n 500] [-j 1] [--cold] [--cache] [-o out.json]
+#
+# Each worker is a fresh process (like a lazy-apps uWSGI worker), warms up, waits for the others and then renders its
+# share of the payloads. Reports latency percentiles over every card, cards/s over the parallel part, RSS (and the
+# private part of it, which leaves out shared mappings like the asset atlas) after import, warm-up and at the end for
+# each worker, and the mean time of each instrumented stage (see common/metrics.py).
+# The render cache and storage are off unless --cache is given, so every card is a full render.
+
+import argparse, json, multiprocessing, os, sys, time
+from bench.results import percentiles, peak_rss_mb, save
+from common.metrics import process_memory
+
+
+def worker(payloads, warm, barrier, results):
+    memory = {'start': process_memory()}
+    from museca1_5.scorecard import ScoreCard
+    from common.metrics import metrics
+    memory['import'] = process_memory()
+    start = time.perf_counter()
+    if warm:
+        ScoreCard.warm()
+    warm_seconds = time.perf_counter() - start
+    memory['warm'] = process_memory()
+
+    barrier.wait()
+    latencies = []
+    start = time.perf_counter()
+    for data in payloads:
+        card_start = time.perf_counter()
+        ScoreCard(data).generate()
+        latencies.append(time.perf_counter() - card_start)
+    wall = time.perf_counter() - start
+    memory['end'] = process_memory()
+
+    stages = {}
+    for key, hist in metrics.histograms.items():
+        name, labels = json.loads(key)
+        if name == 'stage_seconds':
+            stages[dict(labels)['stage']] = (hist['sum'], hist['count'])
+    results.put({
+        'pid': os.getpid(),
+        'latencies': latencies,
+        'wall_seconds': wall,
+        'warm_seconds': warm_seconds,
+        # Zeros where there's no /proc to read.
+        'rss_mb': dict({point: (value or {}).get('rss', 0) for point, value in memory.items()}, peak=peak_rss_mb()),
+        'anon_mb': {point: (value or {}).get('anon', 0) for point, value in memory.items()},
+        'stages': stages,
+    })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure ScoreCard.generate latency and memory per worker.')
+    parser.add_argument('-n', '--cards', type=int, default=500, help='cards to render in total (default: 500)')
+    parser.add_argument('-j', '--workers', type=int, default=1, help='worker processes rendering at once (default: 1)')
+    parser.add_argument('--seed', type=int, default=0, help='payload generator seed (default: 0)')
+    parser.add_argument('--cold', action='store_true', help="don't warm up, so the first cards load assets lazily")
+    parser.add_argument('--cache', action='store_true', help='leave the render cache and storage on')
+    parser.add_argument('-o', '--out', help='results file (default: bench/results/<commit>-render.json)')
+    args = parser.parse_args(argv)
+
+    if not args.cache:
+        os.environ['SCORECARD_CACHE_MB'] = '0'
+        os.environ['SCORECARD_SAVE'] = '0'
+    from bench.payloads import realistic
+    payloads = list(realistic(args.cards, args.seed))
+
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(args.workers)
+    queue = ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(payloads[i::args.workers], not args.cold, barrier, queue))
+                 for i in range(args.workers)]
+    for process in processes:
+        process.start()
+    workers = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    latencies = [seconds for w in workers for seconds in w.pop('latencies')]
+    stages = {}
+    for w in workers:
+        for stage, (total, count) in w.pop('stages').items():
+            previous = stages.get(stage, (0.0, 0))
+            stages[stage] = (previous[0] + total, previous[1] + count)
+    results = {
+        'latency': percentiles(latencies),
+        'throughput_cps': len(latencies) / max(w['wall_seconds'] for w in workers),
+        'warm_seconds': max(w['warm_seconds'] for w in workers),
+        'rss_mb': {point: max(w['rss_mb'][point] for w in workers) for point in workers[0]['rss_mb']},
+        'anon_mb': {point: max(w['anon_mb'][point] for w in workers) for point in workers[0]['anon_mb']},
+        'stages_ms': {stage: total / count * 1000 for stage, (total, count) in sorted(stages.items())},
+        'workers': workers,
+    }
+
+    latency = results['latency']
+    print(f"{latency['count']} cards on {args.workers} worker(s): {results['throughput_cps']:.1f} cards/s, "
+          f"p50 {latency['p50_ms']:.1f}ms, p90 {latency['p90_ms']:.1f}ms, p99 {latency['p99_ms']:.1f}ms, "
+          f"max {latency['max_ms']:.1f}ms")
+    for w in workers:
+        rss, anon = w['rss_mb'], w['anon_mb']
+        print(f"  worker {w['pid']}: warm-up {w['warm_seconds']:.2f}s, rss {rss['import']:.0f}MB after import, "
+              f"{rss['warm']:.0f}MB warm, {rss['end']:.0f}MB at the end (peak {rss['peak']:.0f}MB, "
+              f"{anon['end']:.0f}MB of it private)")
+    for stage, ms in results['stages_ms'].items():
+        print(f'  {stage:>24}: {ms:7.3f} ms')
+    save('render', vars(args), results, args.out)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
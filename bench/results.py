@@ -0,0 +1,67 @@
+# Shared bits of the benchmark scripts: percentiles, memory readings and saving results as json so runs on different
+# commits can be compared with python -m bench.compare.
+
+import json, os, platform, resource, subprocess, sys, time
+from pathlib import Path
+from common.metrics import process_memory
+
+RESULTS_DIR = Path(__file__).parent / 'results'
+
+
+def percentiles(seconds):
+    """Latency summary in ms of a list of durations in seconds."""
+    if not seconds:
+        return {'count': 0}
+    ordered = sorted(seconds)
+
+    def at(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+    return {
+        'count': len(ordered),
+        'mean_ms': sum(ordered) / len(ordered) * 1000,
+        'p50_ms': at(50),
+        'p90_ms': at(90),
+        'p99_ms': at(99),
+        'max_ms': ordered[-1] * 1000,
+    }
+
+
+def rss_mb(pid='self'):
+    memory = process_memory(pid)
+    return memory and memory.get('rss')
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def environment():
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    from PIL import __version__ as pillow
+    return {
+        'commit': git('rev-parse', '--short', 'HEAD'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'pillow': pillow,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def save(name, params, results, out=None):
+    """Write a run to out (default bench/results/<commit>-<name>.json) and return the path."""
+    env = environment()
+    params = {key: value for key, value in params.items() if key != 'out'}
+    if out is None:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        out = RESULTS_DIR / f"{env['commit'] or 'nogit'}{'-dirty' if env['dirty'] else ''}-{name}.json"
+    out = Path(out)
+    with open(out, 'w') as f:
+        json.dump({'benchmark': name, 'environment': env, 'params': params, 'results': results}, f, indent=1)
+    print(f'results saved to {out}', file=sys.stderr)
+    return out
@@ -0,0 +1,86 @@
+# Startup time and memory per worker with and without preloading, the way uWSGI runs them with lazy-apps = false
+# (load and warm once, then fork) and lazy-apps = true (fork, then every worker loads and warms itself).
+# python -m bench.startup [-j 3] [-n 50] [--lazy] [-o out.json]
+#
+# Each worker renders -n cards so the numbers include what serving touches, then all of them read their memory at
+# the same time (pss depends on who else is still sharing). Reports how long until every worker was ready, and per
+# worker rss, pss and private memory: the sum of pss is what the group really uses, private is roughly what one more
+# worker would add. Linux only, it forks and reads /proc.
+
+import argparse, gc, multiprocessing, os, sys, time
+from bench.results import save
+
+os.environ.setdefault('SCORECARD_CACHE_MB', '0')
+os.environ.setdefault('SCORECARD_SAVE', '0')
+
+
+def load():
+    import main
+    main.warm()
+    return main
+
+
+def worker(preloaded, cards, seed, started, barrier, results):
+    if preloaded:
+        gc.enable()  # wsgi.py's post fork hook
+    main = load() if not preloaded else sys.modules['main']
+    ready = time.perf_counter() - started
+    from bench.payloads import realistic
+    from common.metrics import process_memory
+    from lxml import etree
+    for data in realistic(cards, seed + os.getpid()):
+        main.router.render(etree.fromstring(data))
+    barrier.wait()
+    results.put({'pid': os.getpid(), 'ready_seconds': ready, 'memory_mb': process_memory()})
+    barrier.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure worker startup time and memory with and without preload.')
+    parser.add_argument('-j', '--workers', type=int, default=3, help='worker processes (default: 3, like scorecard.ini)')
+    parser.add_argument('-n', '--cards', type=int, default=50, help='cards each worker renders first (default: 50)')
+    parser.add_argument('--seed', type=int, default=0, help='payload generator seed (default: 0)')
+    parser.add_argument('--lazy', action='store_true', help='load in every worker after forking, like lazy-apps = true')
+    parser.add_argument('-o', '--out', help='results file (default: bench/results/<commit>-startup[-lazy].json)')
+    args = parser.parse_args(argv)
+
+    ctx = multiprocessing.get_context('fork')
+    started = time.perf_counter()
+    master_seconds = None
+    if not args.lazy:
+        gc.disable()
+        load()
+        gc.freeze()
+        master_seconds = time.perf_counter() - started
+    barrier = ctx.Barrier(args.workers)
+    queue = ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(not args.lazy, args.cards, args.seed, started, barrier, queue))
+                 for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+    workers = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    memory = [w['memory_mb'] or {} for w in workers]
+    results = {
+        'master_seconds': master_seconds,
+        'all_ready_seconds': max(w['ready_seconds'] for w in workers),
+        'pss_total_mb': sum(m.get('pss', 0) for m in memory),
+        'private_max_mb': max(m.get('private', 0) for m in memory),
+        'rss_max_mb': max(m.get('rss', 0) for m in memory),
+        'workers': workers,
+    }
+
+    mode = 'lazy (each worker loads itself)' if args.lazy else 'preloaded (loaded once, then forked)'
+    print(f"{args.workers} workers, {mode}: all ready after {results['all_ready_seconds']:.2f}s")
+    for w, m in zip(workers, memory):
+        print(f"  worker {w['pid']}: ready after {w['ready_seconds']:.2f}s, rss {m.get('rss', 0):.0f}MB, "
+              f"pss {m.get('pss', 0):.0f}MB, private {m.get('private', 0):.0f}MB")
+    print(f"  together: {results['pss_total_mb']:.0f}MB (sum of pss)")
+    save('startup-lazy' if args.lazy else 'startup', vars(args), results, args.out)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
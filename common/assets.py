@@ -0,0 +1,103 @@
+import logging, os, threading
+from collections import OrderedDict
+from pathlib import Path
+from PIL import Image, ImageFont
+from common.atlas import Atlas, FILENAME as ATLAS
+
+log = logging.getLogger('assets')
+
+
+class AssetCache:
+    """
+    Process-wide store of decoded game assets, one per game module.
+
+    Fonts and sprites (the small fixed overlays like ranks, grades, frames and option badges) are loaded once and kept
+    for the life of the worker. Images (grafica, jackets) go through an LRU that is bounded by decoded size in bytes,
+    so the hot songs stay in memory without the worker growing to the size of the whole asset folder.
+
+    If root has an atlas (python -m common.atlas <root>), sprites and images come out of that instead: read-only views
+    over the shared mapping that cost nothing to keep, so they skip the LRU. Anything the atlas doesn't have (or has
+    an outdated copy of) is still loaded from its png. SCORECARD_ATLAS=0 ignores the atlas.
+
+    Everything handed out is shared between requests. Paste from it, don't draw on it.
+
+    Usage:
+    assets = AssetCache(package_dir / 'assets', max_bytes=32 * 1024 * 1024)
+    font = assets.font('museca.ttf', 50)
+    rank = assets.sprite('rank/rank_1.png')
+    jacket = assets.image('jackets/jk_01_0001_1_b.png')
+    """
+    def __init__(self, root, max_bytes=32 * 1024 * 1024):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.image_bytes = 0
+        self._fonts = {}
+        self._sprites = {}
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+        self.atlas = Atlas.open(self.root / ATLAS) if os.environ.get('SCORECARD_ATLAS', '1') != '0' else None
+
+    def font(self, name, size, index=0):
+        key = (name, size, index)
+        font = self._fonts.get(key)
+        if font is None:
+            # ImageFont doesn't like path objects.
+            font = ImageFont.truetype(str(self.root / 'font' / name), size=size, index=index)
+            self._fonts[key] = font
+        return font
+
+    def sprite(self, name, mode='RGBA'):
+        key = (name, mode)
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            sprite = self._load(name, mode)
+            self._sprites[key] = sprite
+        return sprite
+
+    def image(self, name):
+        if self.atlas is not None:
+            img = self.atlas.get(name)
+            if img is not None:
+                return img
+        with self._lock:
+            img = self._images.get(name)
+            if img is not None:
+                self._images.move_to_end(name)
+                return img
+        img = self._load(name, 'RGBA')
+        size = self._sizeof(img)
+        with self._lock:
+            if name not in self._images:
+                self._images[name] = img
+                self.image_bytes += size
+            while self.image_bytes > self.max_bytes and len(self._images) > 1:
+                _, evicted = self._images.popitem(last=False)
+                self.image_bytes -= self._sizeof(evicted)
+        return img
+
+    def warm(self, fonts=(), sprites=()):
+        """
+        Load fonts and every sprite under the given asset subfolders ahead of the first request.
+        fonts is an iterable of (name, size, index) tuples, sprites an iterable of folder names relative to root.
+        """
+        for name, size, index in fonts:
+            self.font(name, size, index)
+        count = 0
+        for folder in sprites:
+            for path in sorted((self.root / folder).glob('*.png')):
+                self.sprite(path.relative_to(self.root).as_posix())
+                count += 1
+        log.info('Warmed %s fonts and %s sprites from %s', len(self._fonts), count, self.root)
+
+    def _load(self, name, mode):
+        if self.atlas is not None:
+            img = self.atlas.get(name)
+            if img is not None:
+                return img if mode == 'RGBA' else img.convert(mode)
+        with Image.open(self.root / name) as img:
+            # convert() always returns a fully decoded copy, even when the mode already matches.
+            return img.convert(mode)
+
+    @staticmethod
+    def _sizeof(img):
+        return img.width * img.height * len(img.getbands())
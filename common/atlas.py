@@ -0,0 +1,142 @@
+# Packed sprite atlas: every png under an asset folder decoded once into raw RGBA and written back to back into a
+# single file, with an index of where each one starts. Workers mmap it, so they all share the same page cache pages,
+# and hand out images built straight on top of the mapping with no open, no zlib and no copy.
+#
+# python -m common.atlas museca1_5/assets
+#
+# Layout: MAGIC, the index length (8 bytes little endian), the json index, zero padding up to PAGE, then the pixels.
+# The index maps each name (the path relative to the asset folder, like AssetCache takes) to
+# [offset, width, height, source size, source mtime_ns]. Rebuild after changing assets; images whose source has
+# changed since are skipped by open() so the loose png is used instead until then.
+
+import argparse, json, logging, mmap, os, struct, sys, time
+from pathlib import Path
+from PIL import Image
+from common.sidecar import fingerprint
+
+log = logging.getLogger('atlas')
+
+MAGIC = b'SCATLAS1'
+PAGE = 4096
+# Each image starts on a 64 byte boundary.
+ALIGN = 64
+FILENAME = 'atlas.bin'
+
+
+def build_atlas(root, out=None):
+    """Pack every png under root into out (default root/atlas.bin). Returns (images packed, bytes written)."""
+    root = Path(root)
+    out = Path(out) if out else root / FILENAME
+    # Opening a png only reads its header, so the whole index can be laid out before decoding anything.
+    index = {}
+    offset = 0
+    for source in sorted(root.rglob('*.png')):
+        with Image.open(source) as img:
+            width, height = img.size
+        offset += -offset % ALIGN
+        index[source.relative_to(root).as_posix()] = [offset, width, height, *fingerprint(source)]
+        offset += width * height * 4
+    header = json.dumps({'entries': index}, separators=(',', ':')).encode()
+    base = _base(len(header))
+
+    tmp = out.with_name(f'.{out.name}.{os.getpid()}.tmp')
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC + struct.pack('<Q', len(header)) + header)
+            for name, (start, *_) in index.items():
+                with Image.open(root / name) as img:
+                    f.seek(base + start)
+                    f.write(img.convert('RGBA').tobytes())
+        # Replacing rather than overwriting keeps the old file alive for workers that still have it mapped.
+        os.replace(tmp, out)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return len(index), out.stat().st_size
+
+
+def _base(index_length):
+    """Where the pixels start: after the magic, length and index, rounded up to a page."""
+    return -(-(len(MAGIC) + 8 + index_length) // PAGE) * PAGE
+
+
+class Atlas:
+    """
+    Read side of the atlas. get(name) returns a read-only RGBA image over the mapped pixels, or None if the atlas
+    doesn't have it (or has an outdated copy), in which case the caller loads the loose png.
+
+    Usage:
+    atlas = Atlas.open(package_dir / 'assets/atlas.bin')  # None if there isn't one
+    rank = atlas.get('rank/rank_1.png')
+    """
+    def __init__(self, path, buffer, entries, base):
+        self.path = path
+        self._buffer = buffer
+        self._entries = entries
+        self._base = base
+        self._images = {}
+
+    @classmethod
+    def open(cls, path, check=True):
+        """Map the atlas at path, None if there isn't one. check skips images whose png changed since the build."""
+        path = Path(path)
+        try:
+            with open(path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+        if mapped[:len(MAGIC)] != MAGIC:
+            log.error(f"{path} isn't an atlas, ignoring it")
+            return None
+        length, = struct.unpack_from('<Q', mapped, len(MAGIC))
+        entries = json.loads(mapped[len(MAGIC) + 8:len(MAGIC) + 8 + length])['entries']
+        base = _base(length)
+        if check:
+            stale = []
+            for name, (offset, width, height, size, mtime) in entries.items():
+                try:
+                    if fingerprint(path.parent / name) != (size, mtime):
+                        stale.append(name)
+                except FileNotFoundError:
+                    pass  # Deployed without the loose pngs, the atlas is all there is.
+            for name in stale:
+                del entries[name]
+            if stale:
+                log.warning(f'{len(stale)} images changed since {path} was built, using the pngs for those. '
+                            f'Rebuild it with python -m common.atlas {path.parent}')
+        log.info(f'Mapped {len(entries)} images from {path}')
+        return cls(path, memoryview(mapped), entries, base)
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, name):
+        img = self._images.get(name)
+        if img is None:
+            entry = self._entries.get(name)
+            if entry is None:
+                return None
+            offset, width, height = entry[:3]
+            start = self._base + offset
+            view = self._buffer[start:start + width * height * 4]
+            img = self._images[name] = Image.frombuffer('RGBA', (width, height), view, 'raw', 'RGBA', 0, 1)
+        return img
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pack every png under an asset folder into a raw RGBA atlas.')
+    parser.add_argument('root', type=Path, help='asset folder, e.g. museca1_5/assets')
+    parser.add_argument('-o', '--out', type=Path, help=f'atlas file (default: <root>/{FILENAME})')
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    count, size = build_atlas(args.root, args.out)
+    print(f'Packed {count} images into {args.out or args.root / FILENAME} '
+          f'({size / 1024 / 1024:.1f}MB) in {time.perf_counter() - start:.1f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
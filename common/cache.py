@@ -0,0 +1,179 @@
+import hashlib, json, logging, os, threading, time
+from collections import OrderedDict
+from pathlib import Path
+from common.metrics import metrics
+
+log = logging.getLogger('cache')
+
+
+class RenderCache:
+    """
+    Content addressed cache of encoded cards, so cabinet retries and repeat requests skip the render.
+
+    key() hashes whatever the card was drawn from into a hex digest. get()/put() look it up in an in-memory LRU
+    (bounded by max_bytes) first and then, if disk_dir is set, in a shared on-disk tier (bounded by disk_max_bytes)
+    that every worker can hit. Entries older than ttl seconds are misses in both tiers.
+
+    Lookups are counted in metrics as render_cache{result=hit|disk_hit|miss}, and entries pushed out to stay under the
+    size bounds as render_cache_evictions{tier=memory|disk}.
+
+    Configure with SCORECARD_CACHE_MB (0 turns the cache off), SCORECARD_CACHE_TTL, SCORECARD_CACHE_DIR and
+    SCORECARD_CACHE_DISK_MB.
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=600, disk_dir=None, disk_max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        if self.disk_dir:
+            self._scan_disk()
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        return cls(
+            max_bytes=int(float(environ.get('SCORECARD_CACHE_MB', 64)) * 1024 * 1024),
+            ttl=int(environ.get('SCORECARD_CACHE_TTL', 600)),
+            disk_dir=environ.get('SCORECARD_CACHE_DIR') or None,
+            disk_max_bytes=int(float(environ.get('SCORECARD_CACHE_DISK_MB', 512)) * 1024 * 1024),
+        )
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(*parts):
+        """Canonical digest of json-serializable parts. Dict order doesn't matter, everything else does."""
+        blob = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[0] > self.ttl:
+                self._drop(key)
+                entry = None
+            elif entry is not None:
+                self._memory.move_to_end(key)
+        if entry is not None:
+            metrics.count('render_cache', result='hit')
+            return entry[1]
+        data = self._read_disk(key, now)
+        if data is None:
+            metrics.count('render_cache', result='miss')
+            return None
+        metrics.count('render_cache', result='disk_hit')
+        self._remember(key, data, now)
+        return data
+
+    def put(self, key, data):
+        if not self.enabled:
+            return
+        now = time.time()
+        self._remember(key, data, now)
+        if self.disk_dir:
+            self._write_disk(key, data)
+
+    def _remember(self, key, data, now):
+        evicted = 0
+        with self._lock:
+            if key in self._memory:
+                self._drop(key)
+            self._memory[key] = (now, data)
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.max_bytes and self._memory:
+                self._drop(next(iter(self._memory)))
+                evicted += 1
+        if evicted:
+            metrics.count('render_cache_evictions', evicted, tier='memory')
+
+    def _drop(self, key):
+        stored, data = self._memory.pop(key)
+        self._memory_bytes -= len(data)
+
+    # ----- Disk tier -----
+    # Files live at disk_dir/<first 2 hex chars>/<key>, their mtime is the insert time and their atime gets bumped on
+    # hits for LRU. Each worker keeps its own index of the directory, so the size bound is approximate when several
+    # workers write at once; a file another worker already removed is just a miss.
+
+    def _path(self, key):
+        return self.disk_dir / key[:2] / key
+
+    def _scan_disk(self):
+        entries = []
+        for path in self.disk_dir.glob('??/*'):
+            if path.suffix == '.tmp':
+                continue
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_atime, path.name, st.st_size))
+        for atime, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        log.info(f'Render cache has {len(self._disk)} cards on disk in {self.disk_dir}')
+
+    def _read_disk(self, key, now):
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            if now - path.stat().st_mtime > self.ttl:
+                self._remove_disk(key)
+                return None
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path, (now, path.stat().st_mtime))
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self._disk_bytes += len(data) - self._disk.pop(key, 0)
+            self._disk[key] = len(data)
+        return data
+
+    def _write_disk(self, key, data):
+        path = self._path(key)
+        tmp = path.with_name(f'{key}.{os.getpid()}.{threading.get_ident()}.tmp')
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            log.error(f"Couldn't write {path} to the render cache: {e!r}")
+            return
+        evict = []
+        with self._lock:
+            self._disk_bytes += len(data) - self._disk.pop(key, 0)
+            self._disk[key] = len(data)
+            while self._disk_bytes > self.disk_max_bytes and len(self._disk) > 1:
+                old, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                evict.append(old)
+        if evict:
+            metrics.count('render_cache_evictions', len(evict), tier='disk')
+        for old in evict:
+            self._unlink(old)
+
+    def _remove_disk(self, key):
+        with self._lock:
+            self._disk_bytes -= self._disk.pop(key, 0)
+        self._unlink(key)
+
+    def _unlink(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+render_cache = RenderCache.from_env()
@@ -0,0 +1,61 @@
+import logging, os
+from io import BytesIO
+
+log = logging.getLogger('encode')
+
+MIMETYPES = {'png': 'image/png', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+
+class Encoder:
+    """
+    Encodes a finished card straight into memory.
+    PNG is lossless, compress_level trades CPU for bytes (1 is fast, 9 is small) and optimize makes it slower still.
+    WebP and JPEG use quality (WebP can also go lossless). JPEG has no alpha, so the card has to be RGB.
+
+    Configure per deployment with environment variables (scorecard.ini sets them with env = ...):
+    SCORECARD_FORMAT=png|webp|jpeg, SCORECARD_QUALITY=90, SCORECARD_COMPRESS_LEVEL=6, SCORECARD_OPTIMIZE=0,
+    SCORECARD_LOSSLESS=0
+    """
+    def __init__(self, format='png', quality=90, compress_level=6, optimize=False, lossless=False):
+        format = format.lower().replace('jpg', 'jpeg')
+        if format not in MIMETYPES:
+            raise ValueError(f'Unsupported image format {format}, use one of {", ".join(MIMETYPES)}')
+        self.format = format
+        self.quality = quality
+        self.compress_level = compress_level
+        self.optimize = optimize
+        self.lossless = lossless
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        return cls(
+            format=environ.get('SCORECARD_FORMAT', 'png'),
+            quality=int(environ.get('SCORECARD_QUALITY', 90)),
+            compress_level=int(environ.get('SCORECARD_COMPRESS_LEVEL', 6)),
+            optimize=environ.get('SCORECARD_OPTIMIZE', '0') == '1',
+            lossless=environ.get('SCORECARD_LOSSLESS', '0') == '1',
+        )
+
+    @property
+    def mimetype(self):
+        return MIMETYPES[self.format]
+
+    @property
+    def extension(self):
+        return 'jpg' if self.format == 'jpeg' else self.format
+
+    def options(self):
+        if self.format == 'png':
+            return {'compress_level': self.compress_level, 'optimize': self.optimize}
+        if self.format == 'webp':
+            return {'quality': self.quality, 'lossless': self.lossless, 'method': 4}
+        return {'quality': self.quality, 'optimize': self.optimize}
+
+    def encode(self, img) -> BytesIO:
+        out = BytesIO()
+        img.save(out, format=self.format, **self.options())
+        out.seek(0)
+        return out
+
+
+encoder = Encoder.from_env()
@@ -0,0 +1,52 @@
+from PIL import Image, ImageDraw
+
+
+def text_mask(text, font):
+    """
+    Rasterize text once into an L mask cropped to its ink, so it can be pasted with a fill colour later instead of
+    going through FreeType again: base.paste(fill, (x + dx, y + dy), mask=mask) looks the same as
+    ImageDraw.text((x, y), text, fill, font). Returns (mask, (dx, dy)), mask is None if the text has no ink.
+    """
+    w, h = font.getsize(text)
+    pad = font.size  # room for glyphs that hang outside their advance box
+    canvas = Image.new('L', (w + 2 * pad, h + 2 * pad), 0)
+    ImageDraw.Draw(canvas).text((pad, pad), text, 255, font=font)
+    bbox = canvas.getbbox()
+    if bbox is None:
+        return None, (0, 0)
+    return canvas.crop(bbox), (bbox[0] - pad, bbox[1] - pad)
+
+
+class GlyphStrip:
+    """
+    Pre-rasterized masks for a small set of characters in one font, digits by default, for drawing numbers without
+    per-request FreeType rasterization. Glyphs are placed by their advance, which matches ImageDraw.text for fonts
+    without kerning between these characters (the museca font has none).
+
+    Usage:
+    digits = GlyphStrip(assets.font('museca.ttf', 22))
+    digits.draw_right(base, (694, 496), '1007', (0, 0, 0))  # same as draw.text((694 - width, 496), ...)
+    """
+    def __init__(self, font, chars='0123456789+-'):
+        self.glyphs = {}
+        for char in chars:
+            mask, offset = text_mask(char, font)
+            # The difference between one and two copies is the pen advance, even if the glyph's ink overhangs it.
+            advance = font.getsize(char * 2)[0] - font.getsize(char)[0]
+            self.glyphs[char] = (mask, offset, advance)
+
+    def width(self, text):
+        return sum(self.glyphs[char][2] for char in text)
+
+    def draw(self, base, xy, text, fill):
+        x, y = xy
+        for char in text:
+            mask, (dx, dy), advance = self.glyphs[char]
+            if mask is not None:
+                base.paste(fill, (x + dx, y + dy), mask=mask)
+            x += advance
+
+    def draw_right(self, base, xy, text, fill):
+        """Draw text so it ends at x, the way the card right-aligns its numbers."""
+        x, y = xy
+        self.draw(base, (x - self.width(text), y), text, fill)
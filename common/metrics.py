@@ -0,0 +1,224 @@
+import atexit, cProfile, json, logging, os, random, tempfile, threading, time
+from contextlib import contextmanager
+from pathlib import Path
+
+log = logging.getLogger('metrics')
+
+# Histogram bucket upper bounds in seconds.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metrics:
+    """
+    Counters and stage timing histograms for this process, shared with the others through a directory.
+
+    Each process keeps its numbers in memory and writes them to <directory>/<pid>-<random>.json on flush() (call it
+    at the end of every request, it's a few KB) and at exit, so uWSGI workers, pool processes and the app serving
+    /metrics all end up in the same place. render() merges every file into Prometheus text. Files from processes that
+    have exited are kept so their counts aren't lost, and a new process never takes over an old file even if it gets
+    the same pid. A server calls clear() once when it starts so the last run's numbers don't add up with its own.
+
+    Configure with SCORECARD_METRICS_DIR. Without it the first process to import this picks a directory of its own
+    and exports it to the processes it starts, so a server, batch.py and the benchmarks never mix their numbers, and
+    cleans it up when it exits. For profiling, SCORECARD_PROFILE_MS turns on cProfile for a sample of requests
+    (SCORECARD_PROFILE_RATE, 0-1) and dumps the stats of the ones slower than that to SCORECARD_PROFILE_DIR.
+
+    Usage:
+    with metrics.stage('parse'):
+        call = etree.parse(...)
+    metrics.count('failures', reason='unknown_song')
+    """
+    def __init__(self, directory, profile_ms=0, profile_rate=1.0, profile_dir=None, owner=None):
+        self.directory = Path(directory)
+        self.profile_ms = profile_ms
+        self.profile_rate = profile_rate
+        self.profile_dir = Path(profile_dir) if profile_dir else self.directory / 'profiles'
+        # pid of the process that made up the directory and removes it at exit, None if it was configured.
+        self.owner = owner
+        self.reset()
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        directory, owner = environ.get('SCORECARD_METRICS_DIR'), None
+        if not directory:
+            directory, owner = str(Path(tempfile.gettempdir()) / f'scorecard-metrics-{os.getpid()}'), os.getpid()
+            environ['SCORECARD_METRICS_DIR'] = directory
+        return cls(
+            directory=directory,
+            profile_ms=float(environ.get('SCORECARD_PROFILE_MS', 0)),
+            profile_rate=float(environ.get('SCORECARD_PROFILE_RATE', 1)),
+            profile_dir=environ.get('SCORECARD_PROFILE_DIR') or None,
+            owner=owner,
+        )
+
+    @staticmethod
+    def _key(name, labels):
+        return json.dumps([name, sorted(labels.items())])
+
+    def count(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    hist['buckets'][i] += 1
+            hist['sum'] += seconds
+            hist['count'] += 1
+
+    @contextmanager
+    def stage(self, name):
+        """Time the block into the scorecard_stage_seconds histogram, labelled with the stage name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('stage_seconds', time.perf_counter() - start, stage=name)
+
+    def laps(self, prefix):
+        """
+        For timing consecutive sections without nesting them all in with blocks: every call of the returned function
+        records the time since the previous call (or since laps() was called) as stage <prefix>.<name>.
+        """
+        last = [time.perf_counter()]
+
+        def lap(name):
+            now = time.perf_counter()
+            self.observe('stage_seconds', now - last[0], stage=f'{prefix}.{name}')
+            last[0] = now
+        return lap
+
+    @contextmanager
+    def profile(self, label):
+        """Profile a sample of the wrapped requests, dumping cProfile stats for the ones over profile_ms."""
+        if not self.profile_ms or random.random() >= self.profile_rate:
+            yield
+            return
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            elapsed = (time.perf_counter() - start) * 1000
+            if elapsed >= self.profile_ms:
+                self.profile_dir.mkdir(parents=True, exist_ok=True)
+                path = self.profile_dir / f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{label}-{elapsed:.0f}ms.prof'
+                profiler.dump_stats(path)
+                log.info(f'Slow {label} took {elapsed:.0f}ms, profile saved to {path}')
+
+    def reset(self):
+        """
+        Forget everything recorded so far and start a new file. Runs in forked children, so they don't report their
+        parent's numbers or overwrite its file, and swaps the lock too in case a thread that doesn't exist in the child
+        was holding it.
+        """
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self._file = self.directory / f'{os.getpid()}-{os.urandom(4).hex()}.json'
+
+    def clear(self):
+        """Delete every process's numbers. For a server to call once as it starts, before any of its workers do."""
+        for path in self.directory.glob('*.json'):
+            path.unlink(missing_ok=True)
+
+    def flush(self):
+        with self._lock:
+            snapshot = json.dumps({'counters': self.counters, 'histograms': self.histograms})
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp = self.directory / f'.{os.getpid()}.{threading.get_ident()}.tmp'
+            tmp.write_text(snapshot)
+            os.replace(tmp, self._file)
+        except OSError as e:
+            log.error(f"Couldn't write metrics to {self.directory}: {e!r}")
+
+    def close(self):
+        """At exit: flush, or clean up if this is the process that made the directory up (profiles are left there)."""
+        if self.owner != os.getpid():
+            self.flush()
+            return
+        self.clear()
+        try:
+            self.directory.rmdir()
+        except OSError:
+            pass
+
+    def collect(self):
+        """Merge every process's last snapshot. Returns (counters, histograms) keyed like count()/observe()."""
+        self.flush()
+        counters, histograms = {}, {}
+        for path in self.directory.glob('*.json'):
+            try:
+                snapshot = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            for key, value in snapshot['counters'].items():
+                counters[key] = counters.get(key, 0) + value
+            for key, hist in snapshot['histograms'].items():
+                merged = histograms.setdefault(key, {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0})
+                merged['buckets'] = [a + b for a, b in zip(merged['buckets'], hist['buckets'])]
+                merged['sum'] += hist['sum']
+                merged['count'] += hist['count']
+        return counters, histograms
+
+    def render(self):
+        """Prometheus text exposition of collect()."""
+        counters, histograms = self.collect()
+        lines = []
+        for key in sorted(counters):
+            name, labels = json.loads(key)
+            lines.append(f'scorecard_{name}_total{_labels(labels)} {counters[key]}')
+        for key in sorted(histograms):
+            name, labels = json.loads(key)
+            hist = histograms[key]
+            for bound, value in zip(BUCKETS, hist['buckets']):
+                lines.append(f'scorecard_{name}_bucket{_labels(labels + [["le", str(bound)]])} {value}')
+            lines.append(f'scorecard_{name}_bucket{_labels(labels + [["le", "+Inf"]])} {hist["count"]}')
+            lines.append(f'scorecard_{name}_sum{_labels(labels)} {hist["sum"]:.6f}')
+            lines.append(f'scorecard_{name}_count{_labels(labels)} {hist["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for name, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def process_memory(pid='self'):
+    """
+    Memory of a process in MB from /proc, None where there isn't one. rss, anon and file are what top shows. pss splits
+    each shared page between the processes sharing it and private is what only this process has, so for a group of
+    forked workers the sum of their pss is what they really use together, and private is what one more would add.
+    """
+    fields = {'VmRSS': 'rss', 'RssAnon': 'anon', 'RssFile': 'file', 'Pss': 'pss', 'Private_Clean': 'private',
+              'Private_Dirty': 'private'}
+    memory = {}
+    for name in ('status', 'smaps_rollup'):
+        try:
+            with open(f'/proc/{pid}/{name}') as f:
+                for line in f:
+                    field, _, value = line.partition(':')
+                    if field in fields:
+                        key = fields[field]
+                        memory[key] = memory.get(key, 0) + int(value.split()[0]) / 1024
+        except OSError:
+            continue
+    return memory or None
+
+
+metrics = Metrics.from_env()
+atexit.register(metrics.close)
+# Covers multiprocessing and os.fork(). uWSGI's workers don't run these, wsgi.py resets from its post fork hook instead.
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=metrics.reset)
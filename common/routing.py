@@ -0,0 +1,104 @@
+import importlib, json, logging
+from bisect import bisect_right
+from common.metrics import metrics
+from common.scorecard import InvalidCall, UnsupportedGame
+
+log = logging.getLogger('routing')
+
+
+def load_games(path='games.json'):
+    with open(path) as file:
+        return json.load(file)
+
+
+class Router:
+    """
+    Routing table built from games.json: for each model, the datecode ranges sorted by start, so a lookup is a bisect
+    instead of a scan. Overlapping or inverted ranges are rejected when the table is built, so every datecode maps to
+    at most one module.
+
+    Also the registry of renderer classes (<module>.scorecard.ScoreCard, see common.scorecard.BaseScoreCard).
+    load() imports them all up front and warm() preloads their assets, so no request pays for either.
+
+    Usage:
+    router = Router(load_games('games.json'))
+    router.load()
+    module = router.route('PIX:J:B:A:2018073002')  # 'museca1_5', or None if unsupported
+    ScoreCard = router.scorecard(module)
+    """
+    def __init__(self, games):
+        self.games = games
+        self.table = {}
+        self.renderers = {}
+        for model, versions in games.items():
+            ranges = sorted((version['min'], version['max'], version['module']) for version in versions)
+            for start, end, module in ranges:
+                if start > end:
+                    raise ValueError(f'{model} range {start}-{end} for {module} ends before it starts')
+            for (start, end, module), (next_start, next_end, next_module) in zip(ranges, ranges[1:]):
+                if next_start <= end:
+                    raise ValueError(f'{model} ranges overlap: {module} {start}-{end} and '
+                                     f'{next_module} {next_start}-{next_end}')
+            self.table[model] = ([start for start, end, module in ranges], ranges)
+
+    @classmethod
+    def from_file(cls, path='games.json'):
+        return cls(load_games(path))
+
+    @property
+    def modules(self):
+        return sorted({module for starts, ranges in self.table.values() for start, end, module in ranges})
+
+    def route(self, model):
+        """
+        Find the game module for a call@model string like PIX:J:B:A:2018073002.
+        Raises ValueError if the model string is malformed, returns None if the game or version isn't supported.
+        """
+        name, dest, spec, rev, ext = model.split(':')
+        if name not in self.table:
+            return None
+        starts, ranges = self.table[name]
+        i = bisect_right(starts, int(ext)) - 1
+        if i < 0 or int(ext) > ranges[i][1]:
+            return None
+        return ranges[i][2]
+
+    def render(self, call):
+        """
+        Route a parsed call to its game module and render it, the renderer reuses the parsed call.
+        Returns (module, image BytesIO, info, common.storage.Stored or None if it wasn't saved). Raises InvalidCall if
+        the call is malformed and UnsupportedGame if the game or version isn't supported; anything else comes from the
+        renderer, which raises InvalidCall itself for a call it can't read.
+        """
+        with metrics.stage('route'):
+            if call.tag != 'call':  #sanity check
+                raise InvalidCall('invalid data')
+            try:
+                module = self.route(call.get('model'))
+            except (AttributeError, ValueError):
+                raise InvalidCall('invalid data') from None
+        if module is None:
+            raise UnsupportedGame('game or version not supported')
+        card = self.scorecard(module)(call)
+        img, info = card.generate()
+        return module, img, info, card.stored
+
+    def scorecard(self, module):
+        renderer = self.renderers.get(module)
+        if renderer is None:
+            with metrics.stage('import'):
+                renderer = self.renderers[module] = importlib.import_module(f'{module}.scorecard').ScoreCard
+        return renderer
+
+    def load(self):
+        """Import every routed module's renderer."""
+        for module in self.modules:
+            self.scorecard(module)
+        return self
+
+    def warm(self):
+        """Import and preload every routed module's renderer."""
+        for module in self.modules:
+            self.scorecard(module).warm()
+            log.info(f'Warmed {module}')
+        return self
@@ -0,0 +1,106 @@
+import logging
+from io import BytesIO
+from typing import Tuple
+from lxml import etree
+from common.cache import render_cache
+from common.encode import encoder
+from common.metrics import metrics
+from common.storage import background, save_mode, storage
+
+log = logging.getLogger('scorecard')
+
+
+class InvalidCall(ValueError):
+    """
+    The request isn't a call that can be drawn: malformed, or missing or mangling a field. The servers answer 400.
+    reason is what they count it as in failures{reason=...}, subclasses set their own.
+    """
+    reason = 'invalid'
+
+
+class UnknownSong(InvalidCall):
+    """The call is for a song that isn't in the game's music db."""
+    reason = 'unknown_song'
+
+
+class UnsupportedGame(LookupError):
+    """No game module renders this model and datecode. The servers answer 406."""
+    reason = 'unsupported'
+
+
+class BaseScoreCard:
+    """
+    What every game module's ScoreCard looks like to the router. A game subclasses this as <module>.scorecard.ScoreCard
+    and fills in extract_info and create_image; generate() takes care of caching, encoding and saving.
+
+    ScoreCard(save_m) takes the parsed call element, or the raw request (bytes or a file path) and parses it.
+    generate() returns (BytesIO, info). Unless SCORECARD_SAVE=0 the card is also kept in common.storage, and stored
+    is the common.storage.Stored with its id and URL afterwards. It stays None when the card isn't saved, or with
+    SCORECARD_SAVE=async, where the save is left to the background thread after the response.
+    warm() is called once per worker before the first request and should preload whatever the game needs.
+    """
+    stored = None
+
+    def __init__(self, save_m):
+        if isinstance(save_m, etree._Element):
+            # Already parsed by the router, don't parse it twice.
+            self.call = save_m
+            return
+        try:
+            self.call = etree.parse(BytesIO(save_m)).getroot()
+        except TypeError:
+            self.call = etree.parse(save_m).getroot()
+
+    @classmethod
+    def warm(cls):
+        pass
+
+    def extract_info(self, call):
+        """Pull everything the card is drawn from out of the call. Must include anything that changes the image."""
+        raise NotImplementedError
+
+    def cache_key(self, info):
+        """What the render cache keys this card on, the json-serializable parts of info that change the image."""
+        return {k: v for k, v in info.items() if k not in ('etc', 'model')}
+
+    def create_image(self, info):
+        """Draw the card from info, returns a PIL image."""
+        raise NotImplementedError
+
+    def saveImage(self, data, extension='png'):
+        """Keep a copy of the encoded card, returns a common.storage.Stored. Override to keep cards elsewhere."""
+        return storage.save(data, extension)
+
+    def saveLater(self, data, extension):
+        # On the storage thread, queued with pruning, so nothing is waiting on it to report the error to.
+        try:
+            with metrics.stage('store'):
+                self.saveImage(data, extension)
+        except Exception as e:
+            metrics.count('failures', reason='store')
+            log.error(f"Couldn't save a card in the background: {e!r}")
+
+    def generate(self) -> Tuple[BytesIO, dict]:
+        with metrics.stage('extract_info'):
+            info = self.extract_info(self.call)
+        # Everything drawn on the card is in info (timestamp included, at the minute it's drawn at), so the same
+        # upload within the same minute gets the same key.
+        key = render_cache.key(type(self).__module__, encoder.format, encoder.options(), self.cache_key(info))
+        with metrics.stage('cache_get'):
+            cached = render_cache.get(key)
+        if cached is not None:
+            img = BytesIO(cached)
+        else:
+            with metrics.stage('create_image'):
+                image = self.create_image(info)
+            with metrics.stage('encode'):
+                img = encoder.encode(image)
+            render_cache.put(key, img.getvalue())
+        if save_mode == 'async':
+            background.submit(self.saveLater, img.getvalue(), encoder.extension)
+        elif save_mode == '1':
+            # On the request path since the client is given the URL, but it's only a hash, a small sqlite transaction
+            # and a write to the page cache. A cached card (a retry) has the same bytes and so gets its original id.
+            with metrics.stage('store'):
+                self.stored = self.saveImage(img.getvalue(), encoder.extension)
+        return img, info
@@ -0,0 +1,65 @@
+import hashlib, logging, os, pickle
+from pathlib import Path
+
+log = logging.getLogger('sidecar')
+
+# Bump when the layout of a pickled sidecar changes so old files get rebuilt instead of unpickled.
+SIDECAR_VERSION = 1
+
+
+def fingerprint(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def sha1(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_sidecar(source, build, sidecar=None, tag=''):
+    """
+    Return build(source), cached as a pickle next to source (source + '.idx' unless sidecar is given).
+
+    The sidecar is reused when the source's size and mtime match. If they don't, the source is hashed and the sidecar
+    is still reused when the content is the same (e.g. the file was just touched or copied). Otherwise the index is
+    rebuilt and written back atomically, so workers racing to rebuild it can't read a half written file.
+    tag is stored alongside and must match too; use it to invalidate sidecars when build() itself changes.
+    """
+    source = Path(source)
+    sidecar = Path(sidecar) if sidecar else source.with_name(source.name + '.idx')
+    stamp = fingerprint(source)
+    try:
+        with open(sidecar, 'rb') as f:
+            header = pickle.load(f)
+            if header['version'] == SIDECAR_VERSION and header['tag'] == tag:
+                if header['stamp'] == stamp:
+                    return pickle.load(f)
+                if header['sha1'] == sha1(source):
+                    data = pickle.load(f)
+                    _write(sidecar, stamp, header['sha1'], tag, data)
+                    return data
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        log.error(f'Ignoring unreadable sidecar {sidecar}: {e!r}')
+
+    log.info(f'Building index for {source}')
+    data = build(source)
+    try:
+        _write(sidecar, stamp, sha1(source), tag, data)
+    except OSError as e:
+        log.error(f"Couldn't write sidecar {sidecar}: {e!r}")
+    return data
+
+
+def _write(sidecar, stamp, digest, tag, data):
+    tmp = sidecar.with_name(f'{sidecar.name}.{os.getpid()}.tmp')
+    with open(tmp, 'wb') as f:
+        # Header and data are separate pickles so a stale sidecar can be rejected without unpickling the whole index.
+        pickle.dump({'version': SIDECAR_VERSION, 'stamp': stamp, 'sha1': digest, 'tag': tag}, f, pickle.HIGHEST_PROTOCOL)
+        pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, sidecar)
@@ -0,0 +1,227 @@
+# Where saved cards go. Replaces each game module picking the next file name by globbing its static/ folder.
+#
+# python -m common.storage stats
+# python -m common.storage prune
+
+import argparse, hashlib, importlib, logging, os, sqlite3, sys, threading, time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+log = logging.getLogger('storage')
+
+# Housekeeping that the response shouldn't wait on (pruning old cards) runs here, one job at a time.
+background = ThreadPoolExecutor(max_workers=1, thread_name_prefix='storage')
+
+# What save() returns. url is relative to the service unless SCORECARD_STORAGE_URL is set.
+Stored = namedtuple('Stored', ['id', 'sha256', 'extension', 'size', 'url'])
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cards (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sha256 TEXT NOT NULL UNIQUE,
+    extension TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cards_created ON cards (created);
+'''
+
+
+class Storage:
+    """
+    What BaseScoreCard.saveImage talks to. A backend hands out a stable id for every card it keeps and a URL the game
+    client can be given for it, and forgets old cards by itself.
+
+    save(data, extension) returns a Stored. path(card_id, extension) is the local file to serve for a card, or None if
+    there's no such card (or the backend keeps them somewhere url() already points at). prune() applies retention.
+
+    Pick the backend with SCORECARD_STORAGE=package.module:Class, the default is LocalStorage below.
+    """
+    def save(self, data, extension):
+        raise NotImplementedError
+
+    def path(self, card_id, extension):
+        raise NotImplementedError
+
+    def prune(self):
+        pass
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        module, _, name = environ.get('SCORECARD_STORAGE', 'common.storage:LocalStorage').partition(':')
+        return getattr(importlib.import_module(module), name).from_env(environ)
+
+
+class LocalStorage(Storage):
+    """
+    Cards on the local disk, indexed in sqlite.
+
+    Files are named by the sha256 of their bytes and sharded two levels deep (root/ab/cd/abcd....png), so no folder
+    gets huge and the same card uploaded twice (a cabinet retry) is stored once and keeps its id. Ids come from
+    sqlite's AUTOINCREMENT inside a write transaction, so every worker gets a different one and an id is never reused
+    after its card is pruned. The URL is <base_url>/cards/<id>.<extension>.
+
+    Every prune_interval seconds a save also queues prune() on the background thread, which drops cards older than
+    max_age seconds and then the oldest ones until they fit in max_bytes (either 0 for no limit).
+
+    Configure with SCORECARD_STORAGE_DIR, SCORECARD_STORAGE_URL, SCORECARD_STORAGE_MAX_DAYS and
+    SCORECARD_STORAGE_MAX_MB.
+
+    Usage:
+    storage = LocalStorage('cards', max_age=30 * 86400)
+    stored = storage.save(png_bytes, 'png')
+    stored.id, stored.url, storage.path(stored.id, 'png')
+    """
+    def __init__(self, root, base_url='', max_age=30 * 86400, max_bytes=0, prune_interval=300):
+        self.root = Path(root)
+        self.db_path = self.root / 'cards.sqlite3'
+        self.base_url = base_url.rstrip('/')
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.prune_interval = prune_interval
+        # So the first save after starting up prunes.
+        self._pruned = float('-inf')
+        self._local = threading.local()
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        return cls(
+            root=environ.get('SCORECARD_STORAGE_DIR', 'cards'),
+            base_url=environ.get('SCORECARD_STORAGE_URL', ''),
+            max_age=float(environ.get('SCORECARD_STORAGE_MAX_DAYS', 30)) * 86400,
+            max_bytes=int(float(environ.get('SCORECARD_STORAGE_MAX_MB', 0)) * 1024 * 1024),
+        )
+
+    def _db(self):
+        # One connection per thread, and a new one after a fork: sqlite connections can't be shared by either.
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            self.root.mkdir(parents=True, exist_ok=True)
+            # isolation_level=None leaves transactions to the BEGIN/COMMIT below.
+            db = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.executescript(SCHEMA)
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    def _file(self, sha256, extension):
+        return self.root / sha256[:2] / sha256[2:4] / f'{sha256}.{extension}'
+
+    def url(self, card_id, extension):
+        return f'{self.base_url}/cards/{card_id}.{extension}'
+
+    def save(self, data, extension):
+        sha256 = hashlib.sha256(data).hexdigest()
+        db = self._db()
+        card_id = self._find(db, sha256)
+        if card_id is None:
+            # Writing the file inside the transaction keeps prune(), which also holds the write lock, from removing
+            # it between here and the insert.
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                card_id = self._find(db, sha256)
+                if card_id is None:
+                    self._write(self._file(sha256, extension), data)
+                    card_id = db.execute('INSERT INTO cards (sha256, extension, size, created) VALUES (?, ?, ?, ?)',
+                                         (sha256, extension, len(data), time.time())).lastrowid
+                db.execute('COMMIT')
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+        if time.monotonic() - self._pruned > self.prune_interval:
+            self._pruned = time.monotonic()
+            background.submit(self.prune)
+        return Stored(card_id, sha256, extension, len(data), self.url(card_id, extension))
+
+    @staticmethod
+    def _find(db, sha256):
+        row = db.execute('SELECT id FROM cards WHERE sha256 = ?', (sha256,)).fetchone()
+        return row and row[0]
+
+    @staticmethod
+    def _write(path, data):
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def path(self, card_id, extension):
+        row = self._db().execute('SELECT sha256 FROM cards WHERE id = ? AND extension = ?',
+                                 (card_id, extension)).fetchone()
+        if row is None:
+            return None
+        path = self._file(row[0], extension)
+        return path if path.exists() else None
+
+    def stats(self):
+        count, size, oldest = self._db().execute('SELECT COUNT(*), COALESCE(SUM(size), 0), MIN(created) FROM cards') \
+            .fetchone()
+        return {'cards': count, 'bytes': size, 'oldest': oldest}
+
+    def prune(self, batch=500):
+        """Apply max_age and max_bytes. Works through batch cards per transaction so saves aren't held up for long."""
+        removed = 0
+        try:
+            db = self._db()
+            while True:
+                db.execute('BEGIN IMMEDIATE')
+                try:
+                    expired = []
+                    if self.max_age:
+                        expired = db.execute('SELECT id, sha256, extension, size FROM cards WHERE created < ? '
+                                             'ORDER BY id LIMIT ?', (time.time() - self.max_age, batch)).fetchall()
+                    if not expired and self.max_bytes:
+                        total, = db.execute('SELECT COALESCE(SUM(size), 0) FROM cards').fetchone()
+                        for row in db.execute('SELECT id, sha256, extension, size FROM cards ORDER BY id LIMIT ?',
+                                              (batch,)):
+                            if total <= self.max_bytes:
+                                break
+                            expired.append(row)
+                            total -= row[3]
+                    db.executemany('DELETE FROM cards WHERE id = ?', [(row[0],) for row in expired])
+                    for card_id, sha256, extension, size in expired:
+                        self._file(sha256, extension).unlink(missing_ok=True)
+                    db.execute('COMMIT')
+                except BaseException:
+                    db.execute('ROLLBACK')
+                    raise
+                removed += len(expired)
+                if not expired:
+                    break
+        except sqlite3.Error as e:
+            log.error(f"Couldn't prune {self.db_path}: {e!r}")
+        if removed:
+            log.info(f'Pruned {removed} cards from {self.root}')
+        return removed
+
+
+storage = Storage.from_env()
+
+# SCORECARD_SAVE=1 saves each card before answering so the response can carry its id and URL, =async saves it on the
+# background thread after answering (no id or URL then), =0 only streams cards back without keeping a copy.
+save_mode = os.environ.get('SCORECARD_SAVE', '1')
+if save_mode not in ('0', '1', 'async'):
+    raise ValueError(f'SCORECARD_SAVE should be 0, 1 or async, not {save_mode!r}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Look after the stored cards (configured by SCORECARD_STORAGE_*).')
+    parser.add_argument('command', choices=['stats', 'prune'])
+    args = parser.parse_args(argv)
+    if args.command == 'prune':
+        print(f'Pruned {storage.prune()} cards')
+    if hasattr(storage, 'stats'):
+        stats = storage.stats()
+        print(f"{stats['cards']} cards, {stats['bytes'] / 1024 / 1024:.1f}MB" +
+              (f", oldest from {time.strftime('%Y-%m-%d %H:%M', time.localtime(stats['oldest']))}"
+               if stats['oldest'] else ''))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,50 @@
+import hashlib
+
+# A bunch of chars get mapped oddly in the music dbs - bemani specific fuckery. thanks mon
+# Shared by every game, extend it per game with translation(BEMANI_CHARS, {...}).
+BEMANI_CHARS = {
+    u'\u203E': u'~',
+    u'\u301C': u'～',
+    u'\u49FA': u'ê',
+    u'\u5F5C': u'ū',
+    u'\u66E6': u'à',
+    u'\u66E9': u'è',
+    u'\u8E94': u'🐾',
+    u'\u9A2B': u'á',
+    u'\u9A69': u'Ø',
+    u'\u9A6B': u'ā',
+    u'\u9A6A': u'ō',
+    u'\u9AAD': u'ü',
+    u'\u9B2F': u'ī',
+    u'\u9EF7': u'ē',
+    u'\u9F63': u'Ú',
+    u'\u9F67': u'Ä',
+    u'\u973B': u'♠',
+    u'\u9F6A': u'♣',
+    u'\u9448': u'♦',
+    u'\u9F72': u'♥',
+    u'\u9F76': u'♡',
+    u'\u9F77': u'é',
+    u'\u8E59': u'ℱ',
+    u'\u96CB': u'Ǜ',
+    u'\u9B44': u'♃',
+    u'\u9B25': u'Ã',
+    u'\u9B06': u'Ý',
+    u'\u968D': u'Ü',
+    u'\u9B2E': u'¡',
+    u'\u99B9': u'©',
+    u'\u99BF': u'♠',
+}
+
+
+def translation(*maps):
+    """Merge {broken: fixed} maps into a table for str.translate, so a whole string is fixed in one pass."""
+    merged = {}
+    for chars in maps:
+        merged.update(chars)
+    return str.maketrans(merged)
+
+
+def table_tag(table):
+    """Short stable digest of a translation table, for invalidating anything built with it."""
+    return hashlib.sha1(repr(sorted(table.items())).encode()).hexdigest()[:12]
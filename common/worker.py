@@ -0,0 +1,35 @@
+# Process pool side of batch.py and aioserver.py. Pass init as the pool initializer and submit render.
+
+import time
+from lxml import etree
+from common.metrics import metrics
+from common.routing import Router
+
+router = None
+
+
+def init(games_path='games.json'):
+    """Runs once in each pool process: load the routing table, fonts, sprites and music db up front."""
+    global router
+    router = Router.from_file(games_path).warm()
+
+
+def render(data):
+    """
+    Parse, route and render one raw save_m. Returns (module, image bytes, seconds spent, common.storage.Stored or None).
+    Errors are raised as they are by Router.render, and as SyntaxError if the data doesn't parse (lxml's own
+    XMLSyntaxError can't be pickled back to the parent process).
+    """
+    start = time.perf_counter()
+    try:
+        with metrics.profile('worker'):
+            try:
+                with metrics.stage('parse'):
+                    call = etree.fromstring(data)
+            except etree.XMLSyntaxError as e:
+                raise SyntaxError(str(e)) from None
+            module, img, info, stored = router.render(call)
+        return module, img.getvalue(), time.perf_counter() - start, stored
+    finally:
+        metrics.observe('stage_seconds', time.perf_counter() - start, stage='worker')
+        metrics.flush()
@@ -1,7 +1,13 @@
-import json, importlib, time
-from flask import Flask, render_template_string, request, send_file
+import os, time, zipfile
+from urllib.parse import urljoin
+from flask import Flask, jsonify, render_template_string, request, send_file
 from lxml import etree
 from io import BytesIO
+from common.encode import encoder
+from common.metrics import metrics, process_memory
+from common.scorecard import InvalidCall, UnsupportedGame
+from common.storage import storage
+from common import routing
 import logging
 
 logging.basicConfig(level=logging.ERROR, format="[%(asctime)s] [%(levelname)s] %(message)s", datefmt='%H:%M:%S')
@@ -13,44 +19,167 @@ logging.getLogger('websockets').setLevel(logging.CRITICAL)
 app = Flask(__name__, static_url_path='/static')
 
 
-with open('games.json') as file:
-    games = json.load(file)
+# Every game module is imported here rather than on its first request. warm() then preloads their assets.
+_start = time.perf_counter()
+router = routing.Router.from_file('games.json').load()
+
+# How this process got ready, shown on /healthz. pid is where warm() ran, the uWSGI master when preloading.
+startup = {'ready': False, 'pid': os.getpid(), 'load_seconds': time.perf_counter() - _start, 'warm_seconds': None}
+
+# Most cards a single /scorecard/batch request may ask for.
+BATCH_MAX = 50
+
+
+def warm():
+    """
+    Import every game module in games.json and preload its fonts and sprites.
+    Call this once per worker, or once in the uWSGI master before it forks them (wsgi.py does when SCORECARD_WARM=1),
+    so the first request doesn't pay for it. /healthz reports ready from then on.
+    """
+    start = time.perf_counter()
+    router.warm()
+    startup.update(pid=os.getpid(), warm_seconds=time.perf_counter() - start)
+    ready()
+
+
+def ready():
+    """Start answering /healthz with 200. warm() does this, call it directly when starting cold on purpose."""
+    startup['ready'] = True
+
+
+def parse(data):
+    try:
+        return etree.parse(BytesIO(data)).getroot()
+    except:
+        return etree.parse(data).getroot()
 
 
 @app.route("/scorecard", methods=['POST'])
 def main():
-    data = request.get_data()
+    metrics.count('requests', endpoint='scorecard')
+    start = time.perf_counter()
     try:
-        call = etree.parse(BytesIO(data)).getroot()
-        #log.info(etree.tostring(call, pretty_print=True).decode())
-    except:
-        try:
-            call = etree.parse(data).getroot()
-            #log.info(etree.tostring(call, pretty_print=True).decode())
-        except Exception as e:
-            log.info(e)
-            return render_template_string('Failed to parse data.'), 500
+        with metrics.profile('scorecard'):
+            response = app.make_response(scorecard())
+    except BaseException:
+        metrics.flush()
+        raise
+
+    def sent():
+        # The server closes the response once the body has gone out, so request includes sending it.
+        metrics.observe('stage_seconds', time.perf_counter() - start, stage='request')
+        metrics.flush()
+    response.call_on_close(sent)
+    return response
+
 
+def scorecard():
+    with metrics.stage('read'):
+        data = request.get_data()
     try:
-        assert call.tag == 'call'  #sanity check
-        model, dest, spec, rev, ext = call.get('model').split(':')
-    except:
-        return render_template_string('invalid data'), 400
+        with metrics.stage('parse'):
+            call = parse(data)
+    except Exception as e:
+        log.info(e)
+        metrics.count('failures', reason='parse')
+        return render_template_string('Failed to parse data.'), 500
+
+    try:
+        module, img, info, stored = router.render(call)
+        log.info(f'Generating {module} scorecard')
+    except InvalidCall as e:
+        metrics.count('failures', reason=e.reason)
+        return render_template_string(str(e)), 400
+    except UnsupportedGame as e:
+        metrics.count('failures', reason=e.reason)
+        return render_template_string(str(e)), 406
+    except Exception as e:
+        log.error(e)
+        metrics.count('failures', reason='render')
+        return render_template_string(repr(e)), 500
+    response = send_file(img, mimetype=encoder.mimetype, as_attachment=True,
+                         attachment_filename=time.strftime(f"{module}-%Y%m%d-%H%M%S.{encoder.extension}"))
+    if stored:
+        # Where the saved copy can be fetched from later, for the game to show or hand out.
+        response.headers['X-Scorecard-Id'] = str(stored.id)
+        response.headers['X-Scorecard-Url'] = urljoin(request.host_url, stored.url)
+    # From handing the response to the server until it has written all of it to the client. send_file passes the
+    # BytesIO straight through to the server, which then never closes the response itself, so its close callbacks
+    # (the timings) wouldn't run. There's no file descriptor to sendfile() from anyway.
+    response.direct_passthrough = False
+    sending = time.perf_counter()
+    response.call_on_close(lambda: metrics.observe('stage_seconds', time.perf_counter() - sending, stage='send'))
+    return response
+
+
+@app.route("/cards/<int:card_id>.<extension>")
+def card(card_id, extension):
+    """A saved card by the id /scorecard gave it. They never change, so clients may cache them for good."""
+    path = storage.path(card_id, extension)
+    if path is None:
+        return render_template_string('no such card'), 404
+    response = send_file(path.resolve(), conditional=True)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
 
-    # Route the data to the module within the datecode range in games.json
-    for version in games[model]:
-        if int(ext) in range(version['min'], version['max'] + 1):
-            module = version['module']
+@app.route("/scorecard/batch", methods=['POST'])
+def batch():
+    """
+    Render several calls in one request. The body is any root element wrapping up to BATCH_MAX <call> documents,
+    e.g. <calls><call model="...">...</call><call model="...">...</call></calls>
+    Returns a zip with one image per call, named <index>-<module>.<ext> in request order. Calls that fail are
+    listed in errors.txt inside the zip instead.
+    """
+    try:
+        calls = parse(request.get_data()).findall('call')
+    except Exception as e:
+        log.info(e)
+        return render_template_string('Failed to parse data.'), 500
+    if not calls:
+        return render_template_string('no calls in batch'), 400
+    if len(calls) > BATCH_MAX:
+        return render_template_string(f'too many calls in batch, the limit is {BATCH_MAX}'), 413
+
+    out = BytesIO()
+    errors = []
+    with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for i, call in enumerate(calls):
             try:
-                scorecard = importlib.import_module(f'{module}.scorecard').ScoreCard(data)
-                img, info = scorecard.generate()
-                log.info(f'Generating {module} scorecard')
-                return send_file(img, as_attachment=True, attachment_filename=time.strftime(f"{module}-%Y%m%d-%H%M%S.png"))
+                module, img, info, stored = router.render(call)
             except Exception as e:
-                log.error(e)
-                return render_template_string(repr(e)), 500
-    return render_template_string('game or version not supported'), 406
+                errors.append(f'{i}: {e!r}')
+                continue
+            archive.writestr(f'{i}-{module}.{encoder.extension}', img.getvalue())
+        if errors:
+            archive.writestr('errors.txt', '\n'.join(errors) + '\n')
+    log.info(f'Generated batch of {len(calls) - len(errors)}/{len(calls)} scorecards')
+    metrics.count('requests', endpoint='batch')
+    metrics.count('batch_cards', len(calls) - len(errors))
+    metrics.flush()
+    out.seek(0)
+    return send_file(out, mimetype='application/zip', as_attachment=True,
+                     attachment_filename=time.strftime("scorecards-%Y%m%d-%H%M%S.zip"))
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Counters and stage timings from every worker, in Prometheus text format."""
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+
+@app.route("/healthz")
+def healthz():
+    """
+    Readiness: 503 until warm() has run in this worker (or in the master it was forked from), 200 after. The body has
+    the startup times and this worker's memory (see common.metrics.process_memory) for sizing the process count.
+    """
+    status = dict(startup, status='ready' if startup['ready'] else 'warming', worker_pid=os.getpid(),
+                  preloaded=startup['pid'] != os.getpid(), memory_mb=process_memory())
+    return jsonify(status), 200 if startup['ready'] else 503
 
 
 if __name__ == "__main__":
+    metrics.clear()
+    warm()
     app.run(host='0.0.0.0')
@@ -1,14 +1,149 @@
+# Asset build: converts raw jackets and grafica into exactly what create_image pastes, so nothing is converted or
+# resized at request time. A much faster alternative to photoshop batch processing.
+#
+# python -m museca1_5.jacket_resize path/to/raw -j 4
+#
+# Expects path/to/raw/jackets and/or path/to/raw/grafica (searched recursively for pngs) and writes them flat into
+# museca1_5/assets/<kind>/ under the same file name. A manifest remembers the size, mtime and hash of every source, so
+# re-running after dropping in a new song pack only converts the new or changed files.
+#
+# If there's an asset atlas (see common/atlas.py) it's repacked after anything changed, --atlas creates one.
+
+import argparse, json, logging, os, sys, time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 from PIL import Image
-import os
+from common.atlas import FILENAME as ATLAS, build_atlas
+from common.sidecar import fingerprint, sha1
+
+logging.basicConfig(level=logging.ERROR, format="[%(asctime)s] [%(levelname)s] %(message)s", datefmt='%H:%M:%S')
+log = logging.getLogger('jacket_resize')
+log.setLevel(logging.INFO)
+
+package_dir = Path(os.path.relpath(__file__)).parent
+
+# What create_image pastes for each kind: (mode, size).
+TARGETS = {
+    'jackets': ('RGBA', (223, 223)),
+    'grafica': ('RGBA', (248, 248)),
+}
+
+MANIFEST = package_dir / 'assets/build-manifest.json'
+
 
-# Decided to leave this in as an example - a much faster alternative to photoshop batch processing.
-def resize(jacket):
+def resize(source, output, mode='RGBA', size=(223, 223)):
+    """Convert one image to mode and size and save it as output."""
+    with Image.open(source) as base:
+        if base.mode != mode:
+            base = base.convert(mode)
+        if base.size != size:
+            base = base.resize(size, resample=Image.LANCZOS)
+        tmp = output.with_name(f'.{output.name}.{os.getpid()}.tmp')
+        try:
+            base.save(tmp, format='png')
+            os.replace(tmp, output)
+        except Exception:
+            tmp.unlink(missing_ok=True)
+            raise
+
+
+def build(task):
+    """
+    Worker side. task is (kind, source, output, previous manifest entry or None).
+    Returns (output, manifest entry or None, 'built'/'unchanged'/'failed', error, seconds spent).
+    """
+    kind, source, output, previous = task
+    start = time.perf_counter()
     try:
-        base = Image.open(jacket)
-        filename = os.path.split(base.filename)[1]
-        if not base.mode == 'RGBA':
-            base = base.convert('RGBA')
-        base = base.resize((223, 223), resample=Image.LANCZOS)
-        base.save(f"museca/assets/jackets/{filename}")
+        size, mtime = fingerprint(source)
+        digest = sha1(source)
+        entry = {'source': str(source), 'size': size, 'mtime': mtime, 'sha1': digest}
+        if previous and previous['sha1'] == digest and output.exists():
+            return output, entry, 'unchanged', None, time.perf_counter() - start
+        mode, dimensions = TARGETS[kind]
+        resize(source, output, mode, dimensions)
+        return output, entry, 'built', None, time.perf_counter() - start
     except Exception as e:
-        print(e)
+        return output, None, 'failed', repr(e), time.perf_counter() - start
+
+
+def load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_manifest(path, manifest):
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def plan(src, manifest, force=False):
+    """Yield a build task for every source that's new, changed on disk, or whose output has gone missing."""
+    for kind in TARGETS:
+        out_dir = package_dir / 'assets' / kind
+        for source in sorted((src / kind).rglob('*.png')):
+            output = out_dir / source.name
+            previous = manifest.get(output.relative_to(package_dir).as_posix())
+            if not force and previous and output.exists() and \
+                    (previous['size'], previous['mtime']) == fingerprint(source):
+                continue
+            yield kind, source, output, None if force else previous
+
+
+def pack_atlas():
+    start = time.perf_counter()
+    count, size = build_atlas(package_dir / 'assets')
+    log.info(f'Packed {count} images into the atlas ({size / 1024 / 1024:.1f}MB) in {time.perf_counter() - start:.1f}s')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert raw jackets and grafica into card-ready assets.')
+    parser.add_argument('src', type=Path, help='folder containing jackets/ and/or grafica/')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='worker processes (default: all cpus)')
+    parser.add_argument('--force', action='store_true', help='rebuild everything, ignoring the manifest')
+    parser.add_argument('-v', '--verbose', action='store_true', help='log the time taken for every file')
+    parser.add_argument('--atlas', action='store_true', help='(re)pack the asset atlas even if there isn\'t one yet')
+    args = parser.parse_args(argv)
+
+    manifest = load_manifest(MANIFEST)
+    tasks = list(plan(args.src, manifest, args.force))
+    if not tasks:
+        log.info('Everything is up to date')
+        if args.atlas:
+            pack_atlas()
+        return 0
+    for kind in TARGETS:
+        (package_dir / 'assets' / kind).mkdir(parents=True, exist_ok=True)
+
+    start = time.perf_counter()
+    counts = {'built': 0, 'unchanged': 0, 'failed': 0}
+    slowest = []
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        for output, entry, result, error, elapsed in pool.map(build, tasks, chunksize=8):
+            counts[result] += 1
+            slowest.append((elapsed, output.name))
+            if error:
+                log.error(f'{output.name}: {error}')
+                continue
+            manifest[output.relative_to(package_dir).as_posix()] = entry
+            if args.verbose:
+                log.info(f'{output.name}: {result} in {elapsed * 1000:.1f}ms')
+    save_manifest(MANIFEST, manifest)
+
+    wall = time.perf_counter() - start
+    log.info(f"{len(tasks)} files checked in {wall:.1f}s: {counts['built']} built, {counts['unchanged']} unchanged, "
+             f"{counts['failed']} failed")
+    for elapsed, name in sorted(slowest, reverse=True)[:5]:
+        log.info(f'  slowest: {name} {elapsed * 1000:.1f}ms')
+    if args.atlas or (counts['built'] and (package_dir / 'assets' / ATLAS).exists()):
+        pack_atlas()
+    return 1 if counts['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
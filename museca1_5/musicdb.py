@@ -0,0 +1,85 @@
+import logging, threading, time
+from collections import namedtuple
+from lxml import etree
+from common.sidecar import load_sidecar, fingerprint
+
+log = logging.getLogger('musicdb')
+
+# difnum is a (novice, advanced, exhaust) tuple, indexed by music_type.
+Song = namedtuple('Song', ['title', 'artist', 'difnum'])
+
+DIFFICULTIES = ('novice', 'advanced', 'exhaust')
+
+
+# Seek past the xml declaration since we're specifying encoding, cause lxml doesn't like it when we do that.
+def seekXml(path):
+    with open(path, 'r', encoding='shift_jisx0213') as f:
+        if '<?xml' in f.readline():
+            return etree.parse(f)
+        else:
+            f.seek(0)
+            return etree.parse(f)
+
+
+def build_index(path, normalize=None):
+    """Parse music-info-b.xml into {music_id: Song}. The tree is thrown away once the index is built."""
+    normalize = normalize or (lambda text: text)
+    songs = {}
+    for music in seekXml(str(path)).iterfind('music'):
+        info = music.find('info')
+        difficulty = music.find('difficulty')
+        songs[int(music.get('id'))] = Song(
+            normalize(info.findtext('title_name', '')),
+            normalize(info.findtext('artist_name', '')),
+            tuple(difficulty.find(diff).findtext('difnum') for diff in DIFFICULTIES),
+        )
+    return songs
+
+
+class MusicDB:
+    """
+    id -> Song lookup over music-info-b.xml.
+    The index is built on first use (or by load()) and pickled next to the xml, so other workers and later restarts
+    just unpickle it. The xml is re-checked every check_interval seconds and the index is rebuilt if it changed.
+    normalize is applied to titles and artists at build time; change tag whenever normalize changes.
+
+    Usage:
+    mdb = MusicDB(package_dir / 'assets/music-info-b.xml')
+    song = mdb.get(226)
+    song.title, song.artist, song.difnum[2]
+    """
+    def __init__(self, path, normalize=None, tag='', check_interval=30):
+        self.path = path
+        self.normalize = normalize
+        self.tag = tag
+        self.check_interval = check_interval
+        self._songs = None
+        self._stamp = None
+        self._checked = 0
+        self._lock = threading.Lock()
+
+    def get(self, music_id):
+        if self._songs is None or time.monotonic() - self._checked > self.check_interval:
+            self.load()
+        return self._songs.get(int(music_id))
+
+    def load(self):
+        with self._lock:
+            self._checked = time.monotonic()
+            stamp = fingerprint(self.path)
+            if self._songs is not None and stamp == self._stamp:
+                return
+            if self._songs is not None:
+                log.info(f'{self.path} changed, reloading')
+            self._songs = load_sidecar(self.path, lambda path: build_index(path, self.normalize), tag=self.tag)
+            self._stamp = stamp
+
+    def __len__(self):
+        if self._songs is None:
+            self.load()
+        return len(self._songs)
+
+    def __iter__(self):
+        if self._songs is None:
+            self.load()
+        return iter(self._songs.items())
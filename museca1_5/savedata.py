@@ -0,0 +1,111 @@
+import re
+from common.scorecard import InvalidCall
+
+# etc looks like card:182,21,41,medel:10->10,0->1,0->2,coloris:1484,muese:0,cur:20,lane:0,curve:2,seq:2,mission:G20-3(100.00%),DTime:0,0
+# It's split into name:value sections first, so the fields can come in any order and unknown ones are ignored.
+ETC_SECTION = re.compile(r'(\w+):(.*?)(?=,\w+:|$)')
+ETC_MEDEL = re.compile(r'(\d+)->(\d+)')
+ETC_MISSION = re.compile(r'G(\d+)-(\d+)\(([\d.]+)%\)')
+
+# game_3 children read straight into a slot of the same name, and the type they're converted to.
+GAME_3_FIELDS = {
+    'music_id': int,
+    'music_type': int,
+    'score': int,
+    'old_score': int,
+    'clear_type': int,
+    'score_grade': int,
+    'max_chain': int,
+    'critical': int,
+    'near': int,
+    'error': int,
+    'etc': str,
+}
+EAAPPLI_FIELDS = {
+    'player_name': str,
+    'track_no': int,
+}
+OPTIONAL = {'old_score'}
+# Fields that index into fixed tables (difnum, the grade sprites and pointer positions), so any other value is a
+# broken request rather than something the card can be drawn from.
+RANGES = {
+    'music_type': range(3),
+    'score_grade': range(9),
+}
+
+
+class SaveM:
+    """
+    The parts of a game_3/save_m request the card is drawn from, read in a single pass over the parsed call.
+    Raises common.scorecard.InvalidCall (a ValueError) naming the field if the request is missing something or has
+    something unreadable or out of range in it.
+
+    old_score is None if the client didn't add one, mission is None if the play wasn't a mission.
+    title, artist, difficulty and timestamp aren't in the request, ScoreCard.extract_info fills them in.
+
+    Usage:
+    save = SaveM.from_call(etree.fromstring(data))
+    save.music_id, save.grafica[0], save.grafica_medel[0]
+    """
+    __slots__ = ['model', 'music_id', 'music_type', 'score', 'old_score', 'clear_type', 'score_grade', 'max_chain',
+                 'critical', 'near', 'error', 'etc', 'player_name', 'track_no', 'grafica', 'grafica_medel',
+                 'curator_rank', 'curve', 'object_placement', 'mission', 'title', 'artist', 'difficulty', 'timestamp']
+
+    # Everything create_image draws from, which is what the render cache keys on.
+    CARD_FIELDS = [name for name in __slots__ if name not in ('model', 'etc')]
+
+    @classmethod
+    def from_call(cls, call):
+        self = cls()
+        self.model = call.get('model')
+        game_3 = call.find('game_3')
+        if game_3 is None:
+            raise InvalidCall('save_m is missing game_3')
+        eaappli = game_3.find('eaappli')
+        self._read(game_3, GAME_3_FIELDS)
+        self._read(eaappli if eaappli is not None else (), EAAPPLI_FIELDS)
+        self._parse_etc(self.etc)
+        self.title = self.artist = self.difficulty = self.timestamp = None
+        return self
+
+    def _read(self, parent, fields):
+        found = {}
+        for child in parent:
+            if child.tag in fields:
+                found[child.tag] = child.text
+        for name, kind in fields.items():
+            if name not in found:
+                if name not in OPTIONAL:
+                    raise InvalidCall(f'save_m is missing {name}')
+                setattr(self, name, None)
+                continue
+            text = found[name] or ''
+            try:
+                value = kind(text)
+            except ValueError:
+                raise InvalidCall(f'save_m has an unreadable {name}: {text!r}') from None
+            if name in RANGES and value not in RANGES[name]:
+                raise InvalidCall(f'save_m has an out of range {name}: {value}')
+            setattr(self, name, value)
+
+    def _parse_etc(self, etc):
+        sections = dict(ETC_SECTION.findall(etc))
+        try:
+            self.grafica = tuple(int(grafica) for grafica in sections['card'].split(','))[:3]
+            # medel is old->new for each grafica, the card shows the new one.
+            self.grafica_medel = tuple(int(new) for old, new in ETC_MEDEL.findall(sections['medel']))[:3]
+            self.curator_rank = int(sections['cur'])
+            self.curve = int(sections['curve'])
+            self.object_placement = int(sections['seq'])
+        except (KeyError, ValueError):
+            raise InvalidCall(f'save_m has an unreadable etc: {etc!r}') from None
+        if len(self.grafica) != 3 or len(self.grafica_medel) != 3:
+            raise InvalidCall(f'save_m has an unreadable etc: {etc!r}')
+        mission = ETC_MISSION.fullmatch(sections.get('mission', ''))
+        self.mission = (int(mission[1]), int(mission[2]), float(mission[3])) if mission else None
+
+    def card_fields(self):
+        return {name: getattr(self, name) for name in self.CARD_FIELDS}
+
+    def __repr__(self):
+        return f'SaveM({", ".join(f"{name}={getattr(self, name, None)!r}" for name in self.__slots__)})'
@@ -0,0 +1,147 @@
+# SaveM against the sample request and broken versions of it, and what /scorecard answers for those.
+# python -m pytest tests (from the repo root, main.py reads games.json from there)
+
+import json, os
+from pathlib import Path
+import pytest
+from lxml import etree
+
+os.environ.setdefault('SCORECARD_SAVE', '0')
+os.environ.setdefault('SCORECARD_CACHE_MB', '0')
+
+from museca1_5.savedata import SaveM
+
+SAMPLE = Path(__file__).resolve().parent.parent / 'museca1_5' / 'assets' / 'req-game_3-save_m.xml'
+
+
+@pytest.fixture
+def call():
+    return etree.parse(str(SAMPLE)).getroot()
+
+
+def remove(path):
+    def edit(call):
+        element = call.find(path)
+        element.getparent().remove(element)
+    return edit
+
+
+def replace(path, text):
+    def edit(call):
+        call.find(path).text = text
+    return edit
+
+
+# Each of these turns the sample into a request SaveM has to refuse, and the field the error should name.
+BROKEN = {
+    'no game_3': (remove('game_3'), 'game_3'),
+    'no eaappli': (remove('game_3/eaappli'), 'player_name'),
+    'no etc': (remove('game_3/etc'), 'etc'),
+    'no score': (remove('game_3/score'), 'score'),
+    'no track_no': (remove('game_3/eaappli/track_no'), 'track_no'),
+    'empty score': (replace('game_3/score', None), 'score'),
+    'text score': (replace('game_3/score', 'lots'), 'score'),
+    'text music_id': (replace('game_3/music_id', '2x6'), 'music_id'),
+    'music_type 5': (replace('game_3/music_type', '5'), 'music_type'),
+    'negative music_type': (replace('game_3/music_type', '-1'), 'music_type'),
+    'score_grade 9': (replace('game_3/score_grade', '9'), 'score_grade'),
+    'etc without card': (replace('game_3/etc', 'medel:10->10,0->1,0->2,cur:20,curve:2,seq:2'), 'etc'),
+    'etc short card': (replace('game_3/etc', 'card:182,21,medel:10->10,0->1,0->2,cur:20,curve:2,seq:2'), 'etc'),
+    'etc text cur': (replace('game_3/etc', 'card:182,21,41,medel:10->10,0->1,0->2,cur:x,curve:2,seq:2'), 'etc'),
+    'etc garbage': (replace('game_3/etc', 'not an etc'), 'etc'),
+    'etc empty': (replace('game_3/etc', None), 'etc'),
+}
+
+
+def test_sample(call):
+    save = SaveM.from_call(call)
+    assert save.model == 'PIX:J:B:A:2018073002'
+    assert (save.music_id, save.music_type, save.score, save.old_score) == (226, 2, 1000000, 915267)
+    assert (save.clear_type, save.score_grade, save.max_chain) == (4, 8, 1007)
+    assert (save.critical, save.near, save.error) == (1007, 0, 0)
+    assert (save.player_name, save.track_no) == ('TEST', 0)
+    assert save.grafica == (182, 21, 41)
+    assert save.grafica_medel == (10, 1, 2)
+    assert save.curator_rank == 20
+    assert save.curve == 2
+    assert save.object_placement == 2
+    assert save.mission == (20, 3, 100.0)
+
+
+def test_optional(call):
+    remove('game_3/old_score')(call)
+    replace('game_3/etc', 'card:182,21,41,medel:10->10,0->1,0->2,cur:20,curve:2,seq:2')(call)
+    save = SaveM.from_call(call)
+    assert save.old_score is None
+    assert save.mission is None
+
+
+def test_etc_order(call):
+    replace('game_3/etc', 'seq:1,mission:G1-2(50.50%),curve:0,cur:3,medel:0->4,0->5,0->6,card:7,8,9')(call)
+    save = SaveM.from_call(call)
+    assert (save.grafica, save.grafica_medel) == ((7, 8, 9), (4, 5, 6))
+    assert (save.curator_rank, save.curve, save.object_placement, save.mission) == (3, 0, 1, (1, 2, 50.5))
+
+
+@pytest.mark.parametrize('edit, field', BROKEN.values(), ids=BROKEN.keys())
+def test_broken(call, edit, field):
+    edit(call)
+    with pytest.raises(ValueError, match=field):
+        SaveM.from_call(call)
+
+
+@pytest.fixture(scope='module')
+def client():
+    import main
+    return main.app.test_client()
+
+
+def test_scorecard(client, call):
+    response = client.post('/scorecard', data=etree.tostring(call))
+    assert response.status_code == 200
+    assert response.mimetype.startswith('image/')
+
+
+@pytest.mark.parametrize('edit, field', BROKEN.values(), ids=BROKEN.keys())
+def test_scorecard_broken(client, call, edit, field):
+    edit(call)
+    response = client.post('/scorecard', data=etree.tostring(call))
+    assert response.status_code == 400
+    assert field in response.get_data(as_text=True)
+
+
+def test_scorecard_unsupported(client, call):
+    call.set('model', 'PIX:J:B:A:2030010100')
+    assert client.post('/scorecard', data=etree.tostring(call)).status_code == 406
+
+
+def failures():
+    from common.metrics import metrics
+    counts = {}
+    for key, value in metrics.counters.items():
+        name, labels = json.loads(key)
+        if name == 'failures':
+            counts[dict(labels)['reason']] = value
+    return counts
+
+
+def test_scorecard_unknown_song(client, call):
+    replace('game_3/music_id', '9999')(call)
+    before = failures()
+    response = client.post('/scorecard', data=etree.tostring(call))
+    assert response.status_code == 400
+    assert '9999' in response.get_data(as_text=True)
+    after = failures()
+    # Counted once, under its own reason.
+    assert sum(after.values()) - sum(before.values()) == 1
+    assert after['unknown_song'] == before.get('unknown_song', 0) + 1
+
+
+def test_scorecard_render_error(client, call, monkeypatch):
+    # A bug in the renderer is the server's fault, not a 400 or 406, even when it's a ValueError or LookupError.
+    from museca1_5.scorecard import ScoreCard
+
+    def create_image(self, info):
+        raise IndexError('tuple index out of range')
+    monkeypatch.setattr(ScoreCard, 'create_image', create_image)
+    assert client.post('/scorecard', data=etree.tostring(call)).status_code == 500
@@ -1,4 +1,51 @@
-from main import app
+import gc, os, time
+
+try:
+    import uwsgi
+except ImportError:
+    uwsgi = None
+
+# With lazy-apps = false uWSGI imports this file once in the master and forks the workers afterwards, so they start
+# with the music db, routing table, fonts, sprites and layers already loaded and share those pages copy-on-write.
+# With lazy-apps = true (or outside uWSGI) every worker imports it, and warms, itself.
+preloading = uwsgi is not None and uwsgi.worker_id() == 0
+
+if preloading:
+    # No collections while loading, so freed objects don't leave holes in the pages the workers are going to share.
+    gc.disable()
+
+    def after_fork():
+        gc.enable()
+        # uWSGI forks from C and skips os.register_at_fork handlers (unless py-call-osafterfork is set), so the one in
+        # common.metrics doesn't run and every worker would keep writing the master's snapshot file.
+        metrics.reset()
+
+    uwsgi.post_fork_hook = after_fork
+
+_start = time.perf_counter()
+from main import app, log, ready, startup, warm
+from common.metrics import metrics, process_memory
+
+if preloading:
+    # Before any worker exists, so /metrics starts from this run's numbers only. With lazy-apps no single process
+    # gets here first, clear SCORECARD_METRICS_DIR before starting uWSGI instead.
+    metrics.clear()
+
+if os.environ.get('SCORECARD_WARM') == '1':
+    warm()
+else:
+    ready()
+
+if preloading:
+    # Everything loaded so far lives as long as the workers do. Freezing it keeps their collections from writing to
+    # the gc headers of all those objects, which would copy every page they're on into each worker.
+    gc.freeze()
+
+memory = process_memory() or {}
+log.info(f"Started in {time.perf_counter() - _start:.2f}s (load {startup['load_seconds']:.2f}s, warm "
+         f"{startup['warm_seconds'] or 0:.2f}s){', preloaded for the workers' if preloading else ''}, "
+         f"rss {memory.get('rss', 0):.0f}MB")
 
 if __name__ == "__main__":
+    metrics.clear()
     app.run()